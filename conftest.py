@@ -11,11 +11,11 @@ collect_ignore = [
 
 
 @pytest.fixture(scope='function')
-def database(request, mongodb_instance):
+def database(request, mongodb_instance, mongodb_db_prefix):
     """
     Return a clean MongoDB database suitable for testing.
     """
-    db_name = request.node.name.replace('.', '_')
+    db_name = mongodb_db_prefix + request.node.name.replace('.', '_')
     database = mongodb_instance.get_connection()[db_name]
     yield database
     database.client.drop_database(db_name)
@@ -0,0 +1,87 @@
+"""
+Probe the capabilities of the server(s) to which a client connects.
+
+The limits reported by ``hello`` are already tracked by PyMongo's
+monitoring, so a probe costs one ``buildInfo`` round trip (for the
+version), and its result is cached for the client until the topology
+changes (such as on a failover or upgrade).
+
+>>> client = getfixture('mongodb_instance').get_connection()
+>>> caps = probe(client)
+>>> len(caps.version)
+3
+>>> caps.max_bson_size
+16777216
+>>> probe(client) is caps
+True
+"""
+
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import NamedTuple
+
+import pymongo.database
+
+
+class Capabilities(NamedTuple):
+    version: tuple[int, ...]
+    topology_type: str
+    max_wire_version: int
+    max_bson_size: int
+    max_message_size: int
+    max_write_batch_size: int
+
+    @property
+    def is_mongos(self):
+        return self.topology_type == 'Sharded'
+
+    @property
+    def is_replica_set(self):
+        return self.topology_type.startswith('ReplicaSet')
+
+    @classmethod
+    def from_description(cls, build_info, description):
+        servers = description.known_servers
+        return cls(
+            version=tuple(build_info['versionArray'][:3]),
+            topology_type=description.topology_type_name,
+            max_wire_version=min(server.max_wire_version for server in servers),
+            max_bson_size=min(server.max_bson_size for server in servers),
+            max_message_size=min(server.max_message_size for server in servers),
+            max_write_batch_size=min(server.max_write_batch_size for server in servers),
+        )
+
+
+def _signature(description):
+    """
+    Characterize the topology, such that a change in
+    signature may mean a change in capabilities.
+    """
+    return description.topology_type, frozenset(
+        (server.address, server.server_type, server.max_wire_version)
+        for server in description.known_servers
+    )
+
+
+_cache: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def probe(conn) -> Capabilities:
+    """
+    Return the capabilities for the client (or database), probing
+    the server only if the topology has changed since last probed.
+    """
+    client = conn.client if isinstance(conn, pymongo.database.Database) else conn
+    with _lock:
+        signature, capabilities = _cache.get(client, (None, None))
+    if signature == _signature(client.topology_description):
+        return capabilities
+    build_info = client.admin.command('buildInfo')
+    description = client.topology_description
+    capabilities = Capabilities.from_description(build_info, description)
+    with _lock:
+        _cache[client] = _signature(description), capabilities
+    return capabilities
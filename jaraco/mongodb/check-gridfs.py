@@ -2,6 +2,8 @@
 Script to check a GridFS instance for corrupted records.
 """
 
+from __future__ import annotations
+
 import logging
 import sys
 from typing import Annotated
@@ -13,7 +15,7 @@ from more_itertools.recipes import consume
 
 from jaraco.context import ExceptionTrap
 from jaraco.itertools import Counter
-from jaraco.mongodb import helper
+from jaraco.mongodb import dedup, helper, integrity
 from jaraco.ui import progress
 from jaraco.ui.main import main
 
@@ -23,6 +25,7 @@ log = logging.getLogger()
 class FileChecker:
     def __init__(self, gfs, depth):
         self.gfs = gfs
+        self.coll = helper.gridfs_collection(gfs)
         self.depth = depth
 
     def run(self):
@@ -35,9 +38,11 @@ class FileChecker:
         return counter
 
     def process(self, filename):
-        file = self.gfs.get_last_version(filename)
+        query = dict(filename=filename)
+        file = self.coll.files.find_one(query, sort=[('uploadDate', -1)])
         with ExceptionTrap(pymongo.errors.PyMongoError) as trap:
-            file.read(self.depth)
+            # resolve any chunks shared by dedup-gridfs
+            dedup.open_file(self.coll, file).read(self.depth)
         trap.filename = filename
         return trap
 
@@ -46,16 +51,91 @@ class FileChecker:
         log.error("Failed to read %s (%s)", trap.filename, exc)
 
 
+class MetadataChecker:
+    """
+    Check the chunks of every file against its metadata on the
+    server, without reading any file contents.
+    """
+
+    def __init__(self, gfs):
+        self.gfs = gfs
+
+    def run(self):
+        problems = integrity.find_problems(helper.gridfs_collection(self.gfs))
+        counter = Counter(problems)
+        consume(map(self.handle_problem, counter))
+        return counter
+
+    def handle_problem(self, problem):
+        log.error("Inconsistent file %s", problem)
+
+
+class ContentChecker(integrity.ContentVerifier):
+    """
+    Stream every file in full, verifying its checksum.
+    """
+
+    def run(self):
+        bar = progress.TargetProgressBar(self.count())
+        problems = filter(None, bar.iterate(self.verify_all()))
+        counter = Counter(problems)
+        consume(map(self.handle_problem, counter))
+        return counter
+
+    def handle_problem(self, problem):
+        log.error("Failed to verify %s", problem)
+
+
 @main
 def run(
     db: Annotated[gridfs.GridFS, typer.Argument(parser=helper.connect_gridfs)],
     depth: Annotated[
         int, typer.Argument(help='Bytes to read into each file during check')
     ] = 1024,
+    fast: Annotated[
+        bool,
+        typer.Option(
+            help="Check every file's chunks against its metadata on the server "
+            "rather than reading each file",
+        ),
+    ] = False,
+    full: Annotated[
+        bool,
+        typer.Option(
+            help="Read every file in full, verifying its md5 or the digest "
+            "in its metadata",
+        ),
+    ] = False,
+    algorithm: Annotated[
+        str,
+        typer.Option(help="Hash algorithm for files without an md5"),
+    ] = ContentChecker.algorithm,
+    record: Annotated[
+        bool,
+        typer.Option(help="Store the digest in metadata for files lacking one"),
+    ] = False,
+    workers: Annotated[
+        int, typer.Option(help="Number of files to verify concurrently")
+    ] = ContentChecker.workers,
+    bandwidth: Annotated[
+        float, typer.Option(help="Maximum bytes per second to read")
+    ] = float('inf'),
 ):
     logging.basicConfig(stream=sys.stderr)
 
-    checker = FileChecker(db, depth)
+    if fast and full:
+        raise typer.BadParameter("--fast and --full are mutually exclusive")
+
+    checker: FileChecker | MetadataChecker | ContentChecker
+    if full:
+        checker = ContentChecker(db, integrity.Bandwidth(bandwidth))
+        checker.algorithm = algorithm
+        checker.record = record
+        checker.workers = workers
+    elif fast:
+        checker = MetadataChecker(db)
+    else:
+        checker = FileChecker(db, depth)
     counter = checker.run()
 
     print("Encountered", counter.count, "errors")
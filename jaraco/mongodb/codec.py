@@ -20,16 +20,35 @@ datetime.datetime(2019, 1, 1, 0, 0)
 This function is useful in particular if you're accepting JSON queries
 over an HTTP connection and you don't have the luxury of Javascript
 expressions like you see in the Mongo shell or Compass.
+
+For higher throughput, ``fast_decode`` builds plain dicts (which
+retain the order of keys), parses ISO-8601 dates without dateutil
+when it can, and supports MongoDB Extended JSON.
+
+>>> ob = fast_decode('{"_id": {"$oid": "5f1d7c2e9b1e8a3d4c5b6a7f"}}')
+>>> ob['_id']
+ObjectId('5f1d7c2e9b1e8a3d4c5b6a7f')
+>>> ob = fast_decode('{"$gte": {"$date": "2019-01-01T00:00:00Z"}}')
+>>> ob['$gte']
+datetime.datetime(2019, 1, 1, 0, 0, tzinfo=datetime.timezone.utc)
 """
 
 import collections
+import datetime
 import functools
 import json
 
+import bson.errors
+import bson.json_util
 import dateutil.parser
 
 from jaraco.functools import compose
 
+try:
+    import orjson
+except ImportError:
+    pass
+
 
 def maybe_date(obj):
     """
@@ -43,3 +62,71 @@ smart_hook = compose(maybe_date, collections.OrderedDict)
 
 
 decode = functools.partial(json.loads, object_pairs_hook=smart_hook)  # type: ignore[arg-type]
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(text):
+    """
+    Parse an ISO-8601 date, falling back to dateutil for
+    other formats.
+
+    >>> parse_date('2019-01-01')
+    datetime.datetime(2019, 1, 1, 0, 0)
+    >>> parse_date('Jan 1 2019')
+    datetime.datetime(2019, 1, 1, 0, 0)
+    """
+    iso = text[:-1] + '+00:00' if text.endswith('Z') else text
+    try:
+        return datetime.datetime.fromisoformat(iso)
+    except ValueError:
+        return dateutil.parser.parse(text)
+
+
+def fast_hook(obj):
+    """
+    >>> fast_hook({"$date": "2019-01-01"})
+    datetime.datetime(2019, 1, 1, 0, 0)
+    >>> fast_hook({"$regex": "^a", "$options": "i"})
+    Regex('^a', re.IGNORECASE)
+    >>> fast_hook({"$in": [1, 2]})
+    {'$in': [1, 2]}
+
+    Malformed objects raise a ValueError, as for malformed JSON.
+
+    >>> fast_hook({"$date": "2019-01-01", "y": 1})
+    Traceback (most recent call last):
+    ...
+    ValueError: Bad $date, extra field(s): {'$date': '2019-01-01', 'y': 1}
+    >>> fast_hook({"$oid": "zz"})  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: 'zz' is not a valid ObjectId, ...
+    """
+    try:
+        if len(obj) == 1 and isinstance(obj.get('$date'), str):
+            return parse_date(obj['$date'])
+        return bson.json_util.object_hook(obj)
+    except (TypeError, KeyError, OverflowError, bson.errors.BSONError) as exc:
+        raise ValueError(str(exc)) from exc
+
+
+_fast_loads = functools.partial(json.loads, object_hook=fast_hook)
+
+
+def fast_decode(text: str):
+    """
+    Decode the text using ``fast_hook``.
+
+    If ``orjson`` is installed, use it for text that
+    needs no hook (with no keys beginning with ``$``).
+
+    >>> fast_decode('{"key": [1, 2]}')
+    {'key': [1, 2]}
+    >>> fast_decode('{"x": {"$date": "2019-01-01", "y": 1}}')  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: Bad $date, extra field(s): ...
+    """
+    if 'orjson' in globals() and '"$' not in text and '\\u0024' not in text:
+        return orjson.loads(text)
+    return _fast_loads(text)
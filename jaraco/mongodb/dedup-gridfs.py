@@ -0,0 +1,37 @@
+"""
+Script to deduplicate the files in a GridFS bucket, so that
+files with identical contents share one set of chunks.
+
+Read deduplicated files through :class:`jaraco.mongodb.dedup.DedupGridFS`.
+"""
+
+import logging
+import sys
+from typing import Annotated
+
+import gridfs
+import typer
+
+from jaraco.mongodb import dedup, helper
+from jaraco.ui.main import main
+
+log = logging.getLogger()
+
+
+@main
+def run(
+    db: Annotated[gridfs.GridFS, typer.Argument(parser=helper.connect_gridfs)],
+    workers: Annotated[
+        int, typer.Option(help="Number of files to hash concurrently")
+    ] = dedup.Deduplicator.workers,
+    algorithm: Annotated[
+        str, typer.Option(help="Hash algorithm for file contents")
+    ] = dedup.Deduplicator.algorithm,
+):
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
+    deduplicator = dedup.Deduplicator(db)
+    deduplicator.workers = workers
+    deduplicator.algorithm = algorithm
+    log.info("Hashed %s files.", deduplicator.hash_all())
+    log.info("Collapsed %s files.", deduplicator.collapse_all())
@@ -0,0 +1,254 @@
+"""
+Content-addressed deduplication for GridFS.
+
+Each file's digest is kept in its metadata. Files with identical
+contents share one set of chunks: each such file names the digest
+in ``metadata.blob``, and a ``<bucket>.blobs`` collection maps the
+digest to the ``files_id`` of the shared chunks, along with the
+number of files referencing it. That ``files_id`` is allocated for
+the blob and is never the ``_id`` of a file, so deleting a file with
+a dedup-unaware tool such as :class:`gridfs.GridFS` leaves the
+shared chunks intact.
+
+>>> import io
+>>> db = getfixture('database')
+>>> gfs = DedupGridFS(db)
+>>> ids = [gfs.put(io.BytesIO(b'same'), filename=str(n)) for n in range(3)]
+>>> dedup = Deduplicator(gfs)
+>>> dedup.hash_all()
+3
+>>> dedup.collapse_all()
+3
+>>> db.fs.chunks.count_documents({})
+1
+>>> gfs.get(ids[2]).read()
+b'same'
+>>> for id in ids:
+...     gfs.delete(id)
+>>> db.fs.chunks.count_documents({})
+0
+"""
+
+import concurrent.futures
+import hashlib
+
+import bson
+import gridfs
+import pymongo
+from more_itertools import chunked
+from more_itertools.recipes import consume
+
+from . import helper
+
+
+def resolve(coll, file):
+    """
+    Given the root collection of a bucket and a file document,
+    return the file document with the ``_id`` under which the
+    chunks holding its contents are stored.
+    """
+    digest = (file.get('metadata') or {}).get('blob')
+    blob = digest and coll.blobs.find_one({'_id': digest})
+    if not blob:
+        return file
+    return dict(file, _id=blob['files_id'])
+
+
+def open_file(coll, file):
+    """
+    Return a GridOut reading the contents of the file document,
+    resolving any shared chunks.
+    """
+    return gridfs.GridOut(coll, file_document=resolve(coll, file))
+
+
+class DedupGridFS:
+    """
+    A GridFS wrapper that reads and deletes deduplicated files.
+
+    Note that the ``_id`` of a file read from shared chunks is
+    that of its blob.
+
+    Only the methods that don't read contents are forwarded
+    to the wrapped GridFS.
+    """
+
+    forwarded = {'put', 'new_file', 'list', 'exists'}
+
+    def __init__(self, database, collection='fs'):
+        self.gfs = gridfs.GridFS(database, collection)
+        # named as in GridFS (see helper.gridfs_collection)
+        self.coll = self._collection = database[collection]
+
+    def __getattr__(self, name):
+        if name not in self.forwarded:
+            raise AttributeError(name)
+        return getattr(self.gfs, name)
+
+    def get(self, file_id):
+        file = self.coll.files.find_one({'_id': file_id})
+        if file is None:
+            raise gridfs.errors.NoFile(f"no file in gridfs with _id {file_id!r}")
+        return open_file(self.coll, file)
+
+    def get_version(self, filename=None, version=-1, **kwargs):
+        query = dict(kwargs)
+        if filename is not None:
+            query.update(filename=filename)
+        direction, skip = (-1, -version - 1) if version < 0 else (1, version)
+        file = self.coll.files.find_one(
+            query, sort=[('uploadDate', direction)], skip=skip
+        )
+        if file is None:
+            raise gridfs.errors.NoFile(
+                f"no version {version} for filename {filename!r}"
+            )
+        return open_file(self.coll, file)
+
+    def get_last_version(self, filename=None, **kwargs):
+        return self.get_version(filename, **kwargs)
+
+    def find(self, *args, **kwargs):
+        """
+        Generate a GridOut for each file matching the query.
+        """
+        for file in self.coll.files.find(*args, **kwargs):
+            yield open_file(self.coll, file)
+
+    def find_one(self, *args, **kwargs):
+        return next(self.find(*args, limit=1, **kwargs), None)
+
+    def delete(self, file_id):
+        """
+        Delete the file, deleting any shared chunks only when
+        no other file references them.
+        """
+        file = self.coll.files.find_one_and_delete({'_id': file_id})
+        digest = file and (file.get('metadata') or {}).get('blob')
+        if digest is None:
+            self.coll.chunks.delete_many({'files_id': file_id})
+            return
+        blob = self.coll.blobs.find_one_and_update(
+            {'_id': digest},
+            {'$inc': {'refs': -1}},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        deleted = self.coll.blobs.delete_one({'_id': digest, 'refs': {'$lte': 0}})
+        if deleted.deleted_count:
+            self.coll.chunks.delete_many({'files_id': blob['files_id']})
+
+
+class Deduplicator:
+    """
+    Hash the contents of files in a bucket and collapse those with
+    identical contents onto one set of chunks.
+    """
+
+    algorithm = 'sha256'
+    workers = 4
+
+    def __init__(self, gfs):
+        self.coll = helper.gridfs_collection(gfs)
+        self.coll.blobs.create_index('files_id')
+
+    def hash_all(self):
+        """
+        Hash, in parallel, each file lacking a digest. Return
+        the number of files hashed.
+        """
+        query = {f'metadata.{self.algorithm}': {'$exists': False}}
+        unhashed = self.coll.files.find(query)
+        count = 0
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            for batch in chunked(unhashed, self.workers * 10):
+                consume(executor.map(self.hash, batch))
+                count += len(batch)
+        return count
+
+    def hash(self, file):
+        hash = hashlib.new(self.algorithm)
+        grid_out = open_file(self.coll, file)
+        consume(map(hash.update, iter(grid_out.readchunk, b'')))
+        merged = {'$mergeObjects': ['$metadata', {self.algorithm: hash.hexdigest()}]}
+        self.coll.files.update_one(
+            {'_id': file['_id']}, [{'$set': {'metadata': merged}}]
+        )
+
+    def duplicates(self):
+        """
+        Generate the digest, ids, and chunk size of each group of
+        files with identical contents not yet sharing chunks.
+        """
+        digest = f'$metadata.{self.algorithm}'
+        pipeline = [
+            {
+                '$match': {
+                    'metadata.blob': {'$exists': False},
+                    f'metadata.{self.algorithm}': {'$exists': True},
+                }
+            },
+            {
+                '$group': {
+                    '_id': digest,
+                    'ids': {'$push': '$_id'},
+                    'chunkSize': {'$first': '$chunkSize'},
+                }
+            },
+            {
+                '$lookup': {
+                    'from': self.coll.blobs.name,
+                    'localField': '_id',
+                    'foreignField': '_id',
+                    'as': 'blob',
+                }
+            },
+            {'$match': {'$or': [{'ids.1': {'$exists': True}}, {'blob': {'$ne': []}}]}},
+        ]
+        return self.coll.files.aggregate(pipeline, allowDiskUse=True)
+
+    def collapse_all(self):
+        """
+        Collapse all duplicates. Return the number of files
+        collapsed.
+        """
+        groups = self.duplicates()
+        return sum(map(self.collapse, groups))
+
+    def collapse(self, group):
+        """
+        Point the files in the group at the blob for their digest
+        (creating it from a copy of the first file's chunks if
+        needed), then delete their own chunks.
+        """
+        digest, ids = group['_id'], group['ids']
+        blob = self.coll.blobs.find_one({'_id': digest}) or self._create(group)
+        self.coll.blobs.update_one({'_id': digest}, {'$inc': {'refs': len(ids)}})
+        self.coll.files.update_many(
+            {'_id': {'$in': ids}},
+            {'$set': {'metadata.blob': digest, 'chunkSize': blob['chunkSize']}},
+        )
+        self.coll.chunks.delete_many({'files_id': {'$in': ids}})
+        return len(ids)
+
+    def _create(self, group):
+        """
+        Copy the chunks of the first file in the group under a new
+        ``files_id`` and create the blob for them, unless another
+        process created it first.
+        """
+        files_id = bson.ObjectId()
+        chunks = self.coll.chunks.find(
+            {'files_id': group['ids'][0]}, projection={'_id': False}
+        )
+        copies = (dict(chunk, files_id=files_id) for chunk in chunks)
+        for batch in chunked(copies, 100):
+            self.coll.chunks.insert_many(batch)
+        blob = self.coll.blobs.find_one_and_update(
+            {'_id': group['_id']},
+            {'$setOnInsert': {'files_id': files_id, 'chunkSize': group['chunkSize']}},
+            upsert=True,
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        if blob['files_id'] != files_id:
+            self.coll.chunks.delete_many({'files_id': files_id})
+        return blob
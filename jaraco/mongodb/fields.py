@@ -11,15 +11,26 @@ honoring `Restrictions on Field Names
 
 >>> decode(encode('$leading dollar'))
 '$leading dollar'
+
+To escape every key in a document, including those of nested
+documents and of documents in lists:
+
+>>> encode_keys({'a.b': [{'$c': 1}], 'd': {'e': 2}})
+{'a\\Db': [{'\\$c': 1}], 'd': {'e': 2}}
+>>> decode_keys(_)
+{'a.b': [{'$c': 1}], 'd': {'e': 2}}
 """
 
+import itertools
 import re
 
+_encode_table = str.maketrans({'\\': '\\\\', '.': '\\D'})
+_escaped = re.compile(r'\\(.)')
+
 
 def encode(text):
-    text = text.replace('\\', '\\\\')
-    text = re.sub(r'^\$', '\\$', text)
-    return text.replace('.', '\\D')
+    text = text.translate(_encode_table)
+    return '\\' + text if text.startswith('$') else text
 
 
 def unescape(match):
@@ -28,4 +39,55 @@ def unescape(match):
 
 
 def decode(encoded):
-    return re.sub(r'\\(.)', unescape, encoded)
+    if '\\' not in encoded:
+        return encoded
+    return _escaped.sub(unescape, encoded)
+
+
+def _transform_keys(transform, value):
+    """
+    Transform the keys of the dicts in value, returning value itself
+    or, for a container, copying it only if something within changed.
+    """
+    if isinstance(value, dict):
+        return _transform_dict(transform, value)
+    if isinstance(value, list):
+        return _transform_list(transform, value)
+    return value
+
+
+def _transform_dict(transform, doc):
+    result = None
+    for index, (key, item) in enumerate(doc.items()):
+        new_key = transform(key)
+        new_item = _transform_keys(transform, item)
+        if result is None and (new_key != key or new_item is not item):
+            result = type(doc)(itertools.islice(doc.items(), index))
+        if result is not None:
+            result[new_key] = new_item
+    return doc if result is None else result
+
+
+def _transform_list(transform, items):
+    result = None
+    for index, item in enumerate(items):
+        new_item = _transform_keys(transform, item)
+        if result is None and new_item is not item:
+            result = items[:index]
+        if result is not None:
+            result.append(new_item)
+    return items if result is None else result
+
+
+def encode_keys(doc):
+    """
+    Encode every key in the document, recursively.
+    """
+    return _transform_keys(encode, doc)
+
+
+def decode_keys(doc):
+    """
+    Decode every key in the document, recursively.
+    """
+    return _transform_keys(decode, doc)
@@ -1,3 +1,5 @@
+import concurrent.futures
+import contextlib
 import os
 import shlex
 
@@ -20,6 +22,24 @@ def pytest_addoption(parser):
         '--mongodb-uri',
         help="URI to an extant MongoDB instance (supersedes ephemeral)",
     )
+    parser.addoption(
+        '--mongod-templates',
+        action='store_true',
+        help="Start ephemeral instances from cached, pre-initialized data",
+    )
+    parser.addoption(
+        '--mongod-fast-storage',
+        action='store_true',
+        help="Run ephemeral instances on RAM-backed, non-durable storage",
+    )
+    parser.addoption(
+        '--mongodb-workers',
+        choices=['shared', 'pool'],
+        help=(
+            "Under pytest-xdist, start ephemeral instances in the controller and "
+            "either share one among all workers or give each worker its own"
+        ),
+    )
 
 
 @pytest.fixture(scope='session')
@@ -27,8 +47,31 @@ def mongodb_instance(request):
     if 'pymongo' not in globals():
         pytest.skip("pymongo not available")
 
-    yield from _extant_instance(request.config)
-    yield from _ephemeral_instance(request.config)
+    for instance in _first_instance(request.config):
+        # reset and snapshot only this worker's databases
+        instance.db_prefix = _worker_prefix(request.config)
+        yield instance
+        _drop_worker_databases(instance, request.config)
+
+
+def _first_instance(config):
+    """
+    Yield the instance from the first source that supplies one.
+    """
+    for source in _worker_instance, _extant_instance, _ephemeral_instance:
+        supplied = False
+        for instance in source(config):
+            supplied = True
+            yield instance
+        if supplied:
+            return
+
+
+def _worker_instance(config):
+    uri = getattr(config, 'workerinput', {}).get('mongodb_uri')
+    if not uri:
+        return
+    yield service.ExtantInstance(uri)
 
 
 def _extant_instance(config):
@@ -41,9 +84,15 @@ def _extant_instance(config):
 def _ephemeral_instance(config):
     params_raw = config.getoption('mongod_args') or ''
     params = shlex.split(params_raw)
+    if config.getoption('mongodb_profile', None):
+        # profile every database (see jaraco.mongodb.profiler)
+        params += ['--profile', '2']
     try:
         instance = service.MongoDBInstance()
         instance.merge_mongod_args(params)
+        if config.getoption('mongod_templates'):
+            instance.template_root = str(config.cache.mkdir('mongod-templates'))
+        instance.fast_storage = config.getoption('mongod_fast_storage')
         with instance.ensure(), instance.run():
             pymongo.MongoClient(instance.get_connect_hosts())
             yield instance
@@ -55,3 +104,109 @@ def _ephemeral_instance(config):
 @pytest.fixture(scope='session')
 def mongodb_uri(mongodb_instance):
     return mongodb_instance.get_uri()
+
+
+def _worker_prefix(config):
+    """
+    Under pytest-xdist, each worker has its own prefix for
+    database names, so workers sharing a server don't collide.
+    """
+    worker_id = getattr(config, 'workerinput', {}).get('workerid')
+    return f'{worker_id}_' if worker_id else ''
+
+
+@pytest.fixture(scope='session')
+def mongodb_db_prefix(request):
+    """
+    A prefix for the names of databases created by tests, unique
+    to each pytest-xdist worker (empty when not distributed). Databases
+    so named are dropped when the worker finishes.
+    """
+    return _worker_prefix(request.config)
+
+
+def _drop_worker_databases(instance, config):
+    prefix = _worker_prefix(config)
+    if not prefix:
+        return
+    client = instance.get_connection()
+    for name in client.list_database_names():
+        if name.startswith(prefix):
+            client.drop_database(name)
+
+
+class _WorkerInstances:
+    """
+    Ephemeral instances started by the pytest-xdist controller and
+    handed out to workers, then stopped when the session ends.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.strategy = config.getoption('mongodb_workers')
+        self.stack = contextlib.ExitStack()
+        self.available = []
+        self.assigned = {}
+
+    @classmethod
+    def for_config(cls, config):
+        if not hasattr(config, '_mongodb_workers'):
+            config._mongodb_workers = cls(config)
+        return config._mongodb_workers
+
+    def assign(self, worker_id):
+        """
+        Return the URI of the instance for the worker (the same
+        one if the worker is restarted).
+        """
+        if worker_id not in self.assigned:
+            self.assigned[worker_id] = self._next_uri()
+        return self.assigned[worker_id]
+
+    def _next_uri(self):
+        if not self.available:
+            self._start(self._pool_size() if not self.assigned else 1)
+        if self.strategy == 'shared':
+            return self.available[0]
+        return self.available.pop()
+
+    def _pool_size(self):
+        if self.strategy == 'shared':
+            return 1
+        return int(self.config.getoption('numprocesses', None) or 1)
+
+    def _start(self, count):
+        """
+        Start count instances concurrently.
+        """
+        # find (or download) mongod once, rather than in each thread
+        self.stack.enter_context(service.MongoDBInstance.ensure())
+        with concurrent.futures.ThreadPoolExecutor(count) as executor:
+            for context, instance in executor.map(self._start_one, range(count)):
+                self.stack.push(context.__exit__)
+                self.available.append(instance.get_uri())
+
+    def _start_one(self, number):
+        context = contextlib.contextmanager(_ephemeral_instance)(self.config)
+        return context, context.__enter__()
+
+    def close(self):
+        self.stack.close()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """
+    In the pytest-xdist controller, supply the worker with an instance
+    according to ``--mongodb-workers``.
+    """
+    config = node.config
+    if not config.getoption('mongodb_workers') or next(_extant_instance(config), None):
+        return
+    instances = _WorkerInstances.for_config(config)
+    node.workerinput['mongodb_uri'] = instances.assign(node.gateway.id)
+
+
+def pytest_unconfigure(config):
+    instances = getattr(config, '_mongodb_workers', None)
+    instances and instances.close()
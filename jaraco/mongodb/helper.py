@@ -2,13 +2,116 @@
 Helper functions to augment PyMongo
 """
 
+import collections
+import functools
+import os
+import threading
+
 import gridfs
 import pymongo.database
 import pymongo.uri_parser
 
+from . import capabilities
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_uri(uri):
+    """
+    Parse the URI once for each distinct URI, as parsing
+    a ``mongodb+srv`` URI looks up its DNS records. Treat the
+    result as read-only.
+    """
+    return pymongo.uri_parser.parse_uri(uri)
+
+
+@functools.lru_cache(maxsize=256)
+def _connection_key(uri):
+    """
+    Key the URI by the parts that affect the connection, omitting
+    the database and collection unless the database is needed
+    to authenticate.
+
+    >>> _connection_key('mongodb://h1,h2/db.coll') == _connection_key('mongodb://h2,h1')
+    True
+    >>> _connection_key('mongodb://u:p@h/db1') == _connection_key('mongodb://u:p@h/db2')
+    False
+    """
+    parsed = _parse_uri(uri)
+    options = parsed['options']
+    auth_db = (
+        parsed['database']
+        if parsed['username'] and 'authSource' not in options
+        else None
+    )
+    return (
+        parsed['fqdn'] or tuple(sorted(parsed['nodelist'])),
+        parsed['username'],
+        parsed['password'],
+        auth_db,
+        repr(sorted((key.lower(), value) for key, value in options.items())),
+    )
+
+
+class ClientRegistry:
+    """
+    Clients shared within the process, one for each distinct
+    connection (regardless of database or collection) in a URI.
+
+    >>> registry = ClientRegistry()
+    >>> client = registry.get('mongodb://mgo/db1')
+    >>> registry.get('mongodb://mgo/db2') is client
+    True
+    >>> registry.get('mongodb://mgo/db1?readPreference=secondary') is client
+    False
+
+    A client closed by one caller is replaced for the others.
+
+    >>> client.close()
+    >>> registry.get('mongodb://mgo/db1') is client
+    False
+    >>> registry.close()
+
+    Clients aren't shared across a fork; a child process
+    gets new clients.
+    """
+
+    def __init__(self, factory=pymongo.MongoClient):
+        self.factory = factory
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def get(self, uri):
+        key = _connection_key(uri)
+        with self.lock:
+            if self.pid != os.getpid():
+                # clients inherited from the parent are unsafe to use
+                self.clients = {}
+                self.pid = os.getpid()
+            client = self.clients.get(key)
+            if client is None or getattr(client, '_closed', False):
+                client = self.clients[key] = self.factory(uri)
+            return client
+
+    def close(self):
+        """
+        Close all clients.
+        """
+        with self.lock:
+            clients, self.clients = self.clients, {}
+        for client in clients.values():
+            client.close()
+
+
+clients = ClientRegistry()
+"""
+The clients shared by :func:`connect_db` and :func:`connect_gridfs`.
+Call ``clients.close()`` to close them.
+"""
+
 
 def connect_db(
-    uri, default_db_name=None, factory=pymongo.MongoClient
+    uri, default_db_name=None, factory=clients.get
 ) -> pymongo.database.Database:
     """
     Use pymongo to parse a uri (possibly including database name) into
@@ -17,7 +120,10 @@ def connect_db(
     This serves as a convenience function for the common use case where one
     wishes to get the Database object and is less concerned about the
     intermediate MongoClient object that pymongo creates (though the
-    connection is always available as db.client).
+    connection is always available as db.client). The client is
+    shared with other calls for the same connection, so repeated calls
+    for different databases share one pool (pass ``factory`` to
+    construct a client instead).
 
     >>> db = connect_db(
     ...     'mongodb://mongodb.localhost/mydb?readPreference=secondary')
@@ -37,14 +143,16 @@ def connect_db(
     >>> db = connect_db('mongodb://mgo/mydb', 'defaultdb')
     >>> db.name
     'mydb'
+    >>> connect_db('mongodb://mgo/otherdb').client is db.client
+    True
     """
-    uri_p = pymongo.uri_parser.parse_uri(uri)
+    uri_p = _parse_uri(uri)
     client = factory(uri)
     return client.get_database(uri_p['database'] or default_db_name)
 
 
 def get_collection(uri):
-    return pymongo.uri_parser.parse_uri(uri)['collection']
+    return _parse_uri(uri)['collection']
 
 
 def connect_gridfs(uri, db=None) -> gridfs.GridFS:
@@ -52,11 +160,29 @@ def connect_gridfs(uri, db=None) -> gridfs.GridFS:
     Construct a GridFS instance for a MongoDB URI.
     """
     return gridfs.GridFS(
-        db or pymongo.MongoClient(uri).get_database(),
+        db or connect_db(uri),
         collection=get_collection(uri) or 'fs',
     )
 
 
+def gridfs_collection(gfs: gridfs.GridFS):
+    """
+    Return the root collection of the GridFS instance, whose
+    ``files`` and ``chunks`` subcollections hold its data.
+    """
+    # PyMongo 3 mangled the name
+    legacy = getattr(gfs, '_GridFS__collection', None)
+    return getattr(gfs, '_collection', legacy)
+
+
+def ensure_gridfs_indexes(coll):
+    """
+    Create the indexes the GridFS API expects on the root collection.
+    """
+    coll.files.create_index([('filename', 1), ('uploadDate', 1)])
+    coll.chunks.create_index([('files_id', 1), ('n', 1)], unique=True)
+
+
 def server_version(conn):
     """
     >>> conn = getfixture('mongodb_instance').get_connection()
@@ -66,4 +192,18 @@ def server_version(conn):
     >>> set(map(type, ver))
     {<class 'int'>}
     """
-    return tuple(map(int, conn.server_info()['version'].split('.')))
+    return capabilities.probe(conn).version
+
+
+def bounded_map(executor, func, items, bound):
+    """
+    Like ``executor.map``, but only consume items as results are
+    consumed, keeping at most ``bound`` calls outstanding.
+    """
+    pending: collections.deque = collections.deque()
+    for item in items:
+        if len(pending) >= bound:
+            yield pending.popleft().result()
+        pending.append(executor.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
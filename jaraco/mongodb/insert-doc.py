@@ -1,18 +1,119 @@
+import concurrent.futures
+import functools
 import json
+import re
 import sys
+import time
 from typing import Annotated
 
+import bson
 import pymongo.collection
-import pymongo.uri_parser
 import typer
+from bson.raw_bson import RawBSONDocument
+from more_itertools import constrained_batches
 
+from jaraco.mongodb import capabilities, codec, helper
+from jaraco.ui import progress
 from jaraco.ui.main import main
 
 
 def get_collection(uri: str) -> pymongo.collection.Collection:
-    parsed = pymongo.uri_parser.parse_uri(uri)
-    client: pymongo.MongoClient = pymongo.MongoClient(uri)
-    return client[parsed['database']][parsed['collection']]
+    return helper.connect_db(uri)[helper.get_collection(uri)]
+
+
+_separators = re.compile(r'[\s,\[\]]*')
+
+
+def iter_documents(stream, chunk_size=2**20):
+    """
+    Decode the documents from a stream of newline-delimited
+    (or otherwise concatenated) JSON or of a JSON array, reading
+    only as much as needed.
+
+    >>> import io
+    >>> list(iter_documents(io.StringIO('{"a": 1}\\n{"a": 2}\\n'), chunk_size=3))
+    [{'a': 1}, {'a': 2}]
+    >>> list(iter_documents(io.StringIO('[{"a": {"$date": "2019-01-01"}}, {}]')))
+    [{'a': datetime.datetime(2019, 1, 1, 0, 0)}, {}]
+    """
+    decoder = json.JSONDecoder(object_hook=codec.fast_hook)
+    buffer = ''
+    for chunk in iter(functools.partial(stream.read, chunk_size), ''):
+        buffer += chunk
+        pos = 0
+        while True:
+            pos = _separators.match(buffer, pos).end()
+            try:
+                doc, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as exc:
+                if not _incomplete(exc):
+                    raise
+                break
+            yield doc
+        buffer = buffer[pos:]
+    if buffer:
+        # raises for the incomplete or invalid document
+        decoder.raw_decode(buffer)
+
+
+def _incomplete(exc):
+    """
+    Could the decode error be due only to the document being
+    cut off at the end of the text read so far?
+    """
+    # the longest literal, -Infinity, is 9 characters
+    return exc.msg.startswith('Unterminated string') or len(exc.doc) - exc.pos <= 9
+
+
+class RateProgressBar(progress.SimpleProgressBar):
+    """
+    A progress bar reporting the rate of progress.
+    """
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return super().__enter__()
+
+    def get_bar(self, amt):
+        rate = amt / max(time.monotonic() - self.start, 1e-6)
+        return super().get_bar(amt) + f' {rate:,.0f}/s'
+
+
+class BulkLoader:
+    """
+    Insert documents from a stream into the collection, in batches
+    bounded by count and size, from any number of writers.
+    """
+
+    batch_size = 1000
+    batch_bytes = 8 * 2**20
+    ordered = True
+    workers = 1
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def run(self, stream, bar):
+        # never exceed what the server accepts in one request
+        caps = capabilities.probe(self.collection.database)
+        docs = (RawBSONDocument(bson.encode(doc)) for doc in iter_documents(stream))
+        batches = constrained_batches(
+            docs,
+            min(self.batch_bytes, caps.max_message_size),
+            max_count=min(self.batch_size, caps.max_write_batch_size),
+            get_len=lambda doc: len(doc.raw),
+        )
+        count = 0
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor, bar:
+            bound = self.workers * 2
+            for inserted in helper.bounded_map(executor, self.insert, batches, bound):
+                count += inserted
+                bar.report(count)
+        return count
+
+    def insert(self, batch):
+        self.collection.insert_many(batch, ordered=self.ordered)
+        return len(batch)
 
 
 @main
@@ -20,8 +121,35 @@ def run(
     collection: Annotated[
         pymongo.collection.Collection, typer.Argument(parser=get_collection)
     ],
+    bulk: Annotated[
+        bool,
+        typer.Option(
+            help="Insert all documents from newline-delimited JSON or a JSON array"
+        ),
+    ] = False,
+    batch_size: Annotated[
+        int, typer.Option(help="Maximum documents per batch")
+    ] = BulkLoader.batch_size,
+    batch_bytes: Annotated[
+        int, typer.Option(help="Maximum BSON bytes per batch")
+    ] = BulkLoader.batch_bytes,
+    ordered: Annotated[
+        bool, typer.Option(help="Stop a batch at its first failed insert")
+    ] = BulkLoader.ordered,
+    workers: Annotated[
+        int, typer.Option(help="Number of batches to insert concurrently")
+    ] = BulkLoader.workers,
 ):
     """
     Insert a document from stdin into the specified collection.
     """
-    collection.insert_one(json.load(sys.stdin))
+    if not bulk:
+        collection.insert_one(json.load(sys.stdin))
+        return
+    loader = BulkLoader(collection)
+    loader.batch_size = batch_size
+    loader.batch_bytes = batch_bytes
+    loader.ordered = ordered
+    loader.workers = workers
+    count = loader.run(sys.stdin, RateProgressBar(unit='docs'))
+    print("Inserted", count, "documents")
@@ -0,0 +1,281 @@
+"""
+Server-side integrity checks for GridFS, comparing the chunks
+of each file against its metadata without transferring any data.
+
+>>> import io
+>>> db = getfixture('database')
+>>> gfs = gridfs.GridFS(db)
+>>> good = gfs.put(io.BytesIO(b'x' * 600), chunkSize=256)
+>>> bad = gfs.put(io.BytesIO(b'x' * 600), chunkSize=256)
+>>> _ = db.fs.chunks.delete_one(dict(files_id=bad, n=1))
+>>> [problem.files_id == bad for problem in find_problems(db.fs)]
+[True]
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import hashlib
+import threading
+import time
+from typing import Any, NamedTuple
+
+import gridfs
+import pymongo.errors
+from more_itertools import chunked
+
+from . import dedup, helper
+
+
+class Problem(NamedTuple):
+    files_id: Any
+    reason: str
+
+    def __str__(self):
+        return f'{self.files_id}: {self.reason}'
+
+
+def _summarize_chunks(files_name):
+    """
+    Group the chunks by file, computing their count, range of
+    sequence numbers, and total size, then join the file.
+    """
+    return [
+        {
+            '$group': {
+                '_id': '$files_id',
+                'count': {'$sum': 1},
+                'min_n': {'$min': '$n'},
+                'max_n': {'$max': '$n'},
+                'size': {'$sum': {'$binarySize': '$data'}},
+            }
+        },
+        {
+            '$lookup': {
+                'from': files_name,
+                'localField': '_id',
+                'foreignField': '_id',
+                'as': 'file',
+            }
+        },
+        {'$unwind': {'path': '$file', 'preserveNullAndEmptyArrays': True}},
+        {'$project': {'file.metadata': False}},
+    ]
+
+
+def _expected_count():
+    return {'$ceil': {'$divide': ['$file.length', '$file.chunkSize']}}
+
+
+def _inconsistent():
+    """
+    Match a chunk summary inconsistent with its file.
+    """
+    return {
+        '$match': {
+            '$expr': {
+                '$or': [
+                    {'$eq': [{'$type': '$file'}, 'missing']},
+                    {'$ne': ['$count', _expected_count()]},
+                    {'$ne': ['$min_n', 0]},
+                    {'$ne': ['$max_n', {'$subtract': ['$count', 1]}]},
+                    {'$ne': ['$size', '$file.length']},
+                ]
+            }
+        }
+    }
+
+
+def _unshared(blobs_name):
+    """
+    Exclude chunks whose file is gone but which are still
+    shared through a blob (see :mod:`jaraco.mongodb.dedup`).
+    """
+    return [
+        {
+            '$lookup': {
+                'from': blobs_name,
+                'localField': '_id',
+                'foreignField': 'files_id',
+                'as': 'blob',
+            }
+        },
+        {'$match': {'$or': [{'file': {'$exists': True}}, {'blob': []}]}},
+    ]
+
+
+def _diagnose(summary):
+    file = summary.get('file')
+    if file is None:
+        return 'orphaned chunks'
+    if summary['min_n'] != 0 or summary['max_n'] != summary['count'] - 1:
+        return 'gap in chunk sequence'
+    if summary['count'] != -(-file['length'] // file['chunkSize']):
+        return f"{summary['count']} chunks where file has {file['length']} bytes"
+    return f"chunks total {summary['size']} bytes but file has {file['length']}"
+
+
+def _files_without_chunks(chunks_name, blobs_name, version=(5, 0)):
+    """
+    Match non-empty files with no chunks, resolving any shared
+    chunks through the blob (so a missing blob is also caught).
+
+    The chunks are joined on their indexed ``files_id``, stopping
+    at the first on MongoDB 5.0 and later. Earlier servers can't
+    combine a join on fields with a pipeline, so the chunks are
+    unwound as they're joined (never assembling them into one
+    document) and files having any are discarded.
+
+    >>> stages = _files_without_chunks('fs.chunks', 'fs.blobs', (4, 4, 0))
+    >>> any('pipeline' in stage.get('$lookup', {}) for stage in stages)
+    False
+    """
+    shared = {'$arrayElemAt': ['$blob.files_id', 0]}
+    join = {
+        'from': chunks_name,
+        'localField': 'chunks_id',
+        'foreignField': 'files_id',
+        'as': 'chunks',
+    }
+    if version >= (5, 0):
+        first = [{'$limit': 1}, {'$project': {'_id': True}}]
+        find_chunks = [
+            {'$lookup': dict(join, pipeline=first)},
+            {'$match': {'chunks': {'$size': 0}}},
+        ]
+    else:
+        find_chunks = [
+            {'$lookup': join},
+            {'$unwind': {'path': '$chunks', 'preserveNullAndEmptyArrays': True}},
+            {'$match': {'chunks': {'$exists': False}}},
+        ]
+    return [
+        {'$match': {'length': {'$gt': 0}}},
+        {
+            '$lookup': {
+                'from': blobs_name,
+                'localField': 'metadata.blob',
+                'foreignField': '_id',
+                'as': 'blob',
+            }
+        },
+        {'$addFields': {'chunks_id': {'$ifNull': [shared, '$_id']}}},
+        *find_chunks,
+        {'$project': {'_id': True}},
+    ]
+
+
+def find_problems(coll):
+    """
+    Given the root collection of a GridFS bucket (e.g. ``db.fs``),
+    generate a :class:`Problem` for each file whose chunks don't
+    match its metadata and for each set of orphaned chunks.
+    Chunks shared through :mod:`jaraco.mongodb.dedup` are
+    checked only for their presence.
+    """
+    pipeline = (
+        _summarize_chunks(coll.files.name)
+        + [_inconsistent()]
+        + _unshared(coll.blobs.name)
+    )
+    for summary in coll.chunks.aggregate(pipeline, allowDiskUse=True):
+        yield Problem(summary['_id'], _diagnose(summary))
+    version = helper.server_version(coll.database)
+    pipeline = _files_without_chunks(coll.chunks.name, coll.blobs.name, version)
+    for file in coll.files.aggregate(pipeline, allowDiskUse=True):
+        yield Problem(file['_id'], 'missing chunks')
+
+
+class Bandwidth:
+    """
+    Limit the rate, in bytes per second, at which any number
+    of threads consume data.
+    """
+
+    def __init__(self, max_rate=float('inf')):
+        self.max_rate = max_rate
+        self.lock = threading.Lock()
+        self.next = time.monotonic()
+
+    def consume(self, size):
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next, now)
+            self.next = start + size / self.max_rate
+        time.sleep(start - now)
+
+
+class ContentVerifier:
+    """
+    Stream every chunk of each file and compare its checksum against
+    the legacy ``md5`` field or, failing that, the digest for
+    ``algorithm`` in the file's metadata (recording the digest
+    there if it's missing and ``record`` is set).
+
+    >>> import io
+    >>> db = getfixture('database')
+    >>> gfs = gridfs.GridFS(db)
+    >>> good = gfs.put(io.BytesIO(b'x' * 600), chunkSize=256)
+    >>> bad = gfs.put(io.BytesIO(b'x' * 600), chunkSize=256)
+    >>> verifier = ContentVerifier(gfs)
+    >>> verifier.record = True
+    >>> list(verifier.verify_all())
+    [None, None]
+    >>> db.fs.files.find_one(good)['metadata']['sha256'][:8]
+    '5130b33e'
+    >>> _ = db.fs.chunks.update_one(
+    ...     dict(files_id=bad, n=1), {'$set': {'data': b'y' * 256}})
+    >>> [problem.files_id == bad for problem in filter(None, verifier.verify_all())]
+    [True]
+    """
+
+    algorithm = 'sha256'
+    workers = 4
+    record = False
+
+    def __init__(self, gfs, bandwidth=None):
+        self.gfs = gfs
+        self.coll = helper.gridfs_collection(gfs)
+        self.bandwidth = bandwidth or Bandwidth()
+
+    def count(self):
+        return self.coll.files.estimated_document_count()
+
+    def verify_all(self):
+        """
+        Verify every file, generating a :class:`Problem` for each
+        that fails verification (and None for each that passes).
+        """
+        files = self.coll.files.find(batch_size=self.workers * 10)
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            for batch in chunked(files, self.workers * 10):
+                yield from executor.map(self.verify, batch)
+
+    def verify(self, file):
+        algorithm, expected = self._expected(file)
+        try:
+            actual = self.digest(file, algorithm)
+        except (gridfs.errors.CorruptGridFile, pymongo.errors.PyMongoError) as exc:
+            return Problem(file['_id'], f'unreadable ({exc})')
+        if expected is None:
+            self.record and self._record(file['_id'], algorithm, actual)
+        elif actual != expected:
+            return Problem(file['_id'], f'{algorithm} is {actual} not {expected}')
+
+    def _expected(self, file):
+        if 'md5' in file:
+            return 'md5', file['md5']
+        metadata = file.get('metadata') or {}
+        return self.algorithm, metadata.get(self.algorithm)
+
+    def digest(self, file, algorithm):
+        hash = hashlib.new(algorithm)
+        grid_out = dedup.open_file(self.coll, file)
+        for chunk in iter(grid_out.readchunk, b''):
+            self.bandwidth.consume(len(chunk))
+            hash.update(chunk)
+        return hash.hexdigest()
+
+    def _record(self, files_id, algorithm, digest):
+        merged = {'$mergeObjects': ['$metadata', {algorithm: digest}]}
+        self.coll.files.update_one({'_id': files_id}, [{'$set': {'metadata': merged}}])
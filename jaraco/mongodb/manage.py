@@ -1,42 +1,136 @@
+import concurrent.futures
+import contextlib
+import functools
+import itertools
 import re
 from collections.abc import Container
 
+snapshot_prefix = '__snapshot__.'
+"prefix of collections holding a copy saved by :func:`snapshot_collection`"
 
-def all_databases(client, exclude: Container = ['local']):
+server_databases = ['local', 'admin', 'config']
+"databases managed by the server, excluded from resets"
+
+_include_pattern = r'(?!system\.|' + re.escape(snapshot_prefix) + ')'
+
+
+class NamespaceErrors(Exception):
+    """
+    One or more operations failed. ``errors`` maps each failed
+    namespace to its exception and ``results`` maps each
+    succeeded namespace to its result.
+    """
+
+    def __init__(self, errors, results):
+        super().__init__(errors)
+        self.errors = errors
+        self.results = results
+
+
+def run_all(client, tasks, max_workers=None):
+    """
+    Concurrently invoke each task from pairs of (namespace, callable),
+    by default with as many threads as the client has connections.
+    Return a mapping of namespace to result or, once all have run,
+    raise NamespaceErrors if any failed.
+
+    >>> import pymongo
+    >>> client = pymongo.MongoClient(connect=False)
+    >>> run_all(client, [('a', lambda: 1), ('b', lambda: 2)])
+    {'a': 1, 'b': 2}
+    >>> run_all(client, [('a', lambda: 1), ('b', lambda: 1 / 0)])
+    Traceback (most recent call last):
+    ...
+    jaraco.mongodb.manage.NamespaceErrors: {'b': ZeroDivisionError(...)}
+    >>> client.close()
+    """
+    max_workers = max_workers or _pool_size(client)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = {ns: executor.submit(task) for ns, task in tasks}
+    errors = {ns: fut.exception() for ns, fut in futures.items() if fut.exception()}
+    results = {ns: fut.result() for ns, fut in futures.items() if ns not in errors}
+    if errors:
+        raise NamespaceErrors(errors, results)
+    return results
+
+
+def _pool_size(client):
+    """
+    Return the maximum connection pool size for the client.
+    """
+    with contextlib.suppress(AttributeError):
+        return client.options.pool_options.max_pool_size
+
+
+def all_databases(client, exclude: Container = ['local'], prefix=''):
     """
     Yield all databases except excluded (default
-    excludes 'local').
+    excludes 'local') whose names start with prefix.
     """
     return (
         client[db_name]
         for db_name in client.list_database_names()
-        if db_name not in exclude
+        if db_name not in exclude and db_name.startswith(prefix)
     )
 
 
 def all_collections(db):
     """
-    Yield all non-sytem collections in db.
+    Yield all non-sytem collections in db (excluding snapshots).
     """
-    include_pattern = r'(?!system\.)'
     return (
         db[name]
         for name in db.list_collection_names()
-        if re.match(include_pattern, name)
+        if re.match(_include_pattern, name)
     )
 
 
+def collection_infos(db):
+    """
+    Return pairs of each non-system collection in db and
+    its info (including type and options), as fetched
+    in a single listCollections command.
+    """
+    return [
+        (db[info['name']], info)
+        for info in db.list_collections()
+        if re.match(_include_pattern, info['name'])
+    ]
+
+
+def _all_collection_infos(client, exclude, max_workers=None, prefix=''):
+    """
+    Concurrently fetch the collection infos for each database.
+    """
+    listings = run_all(
+        client,
+        (
+            (db.name, functools.partial(collection_infos, db))
+            for db in all_databases(client, exclude, prefix)
+        ),
+        max_workers,
+    )
+    return itertools.chain.from_iterable(listings.values())
+
+
+def _is_view(info):
+    return info.get('type') == 'view'
+
+
 def purge_collection(coll):
-    coll.delete_all({})
+    coll.delete_many({})
 
 
-def safe_purge_collection(coll):
+def safe_purge_collection(coll, options=None):
     """
     Cannot remove documents from capped collections
     in later versions of MongoDB, so drop the
-    collection instead.
+    collection instead. Supply the collection
+    options if already known to avoid a query.
     """
-    op = drop_collection if coll.options().get('capped', False) else purge_collection
+    if options is None:
+        options = coll.options()
+    op = drop_collection if options.get('capped', False) else purge_collection
     return op(coll)
 
 
@@ -44,8 +138,133 @@ def drop_collection(coll):
     coll.database.drop_collection(coll.name)
 
 
-def purge_all_databases(client, op=drop_collection):
-    collections = (coll for db in all_databases(client) for coll in all_collections(db))
+def purge_all_databases(client, op=drop_collection, max_workers=None, prefix=''):
+    """
+    Concurrently invoke op on each collection in each database
+    (whose name starts with prefix), returning the results by
+    namespace (see :func:`run_all`).
+    """
+    infos = _all_collection_infos(client, ['local'], max_workers, prefix)
+    tasks = ((coll.full_name, _bind(op, coll, info)) for coll, info in infos)
+    return run_all(client, tasks, max_workers)
+
+
+def _bind(op, coll, info):
+    """
+    Bind op to the collection, supplying the options already
+    listed to an op that would otherwise query them.
+    """
+    if op is safe_purge_collection:
+        return functools.partial(op, coll, info.get('options', {}))
+    return functools.partial(op, coll)
+
+
+def drop_all_databases(client, exclude: Container = server_databases, prefix=''):
+    """
+    Concurrently drop each database (except excluded, and whose
+    name starts with prefix) in a single command, rather than
+    dropping its collections one by one.
+    """
+    tasks = (
+        (db.name, functools.partial(client.drop_database, db.name))
+        for db in all_databases(client, exclude, prefix)
+    )
+    return run_all(client, tasks)
+
+
+def truncate_all_databases(client, max_workers=None, prefix=''):
+    """
+    Concurrently remove all documents from all collections (in
+    databases whose names start with prefix), retaining the
+    collections and their indexes.
+    """
+    infos = _all_collection_infos(client, server_databases, max_workers, prefix)
+    tasks = (
+        (coll.full_name, _bind(safe_purge_collection, coll, info))
+        for coll, info in infos
+        if not _is_view(info)
+    )
+    return run_all(client, tasks, max_workers)
+
+
+def _index_specs(coll):
+    """
+    Return the specs suitable for createIndexes for the
+    indexes on coll, other than the default _id index.
+    """
+    return [
+        {key: value for key, value in index.items() if key != 'ns'}
+        for index in coll.list_indexes()
+        if index['name'] != '_id_'
+    ]
+
 
-    for coll in collections:
-        op(coll)
+def _create_indexes(coll, specs):
+    specs and coll.database.command('createIndexes', coll.name, indexes=specs)
+
+
+def snapshot_collection(coll):
+    """
+    Save a copy of the documents and indexes of coll
+    to a collection alongside it.
+    """
+    saved = coll.database[snapshot_prefix + coll.name]
+    drop_collection(saved)
+    coll.aggregate([{'$out': saved.name}])
+    _create_indexes(saved, _index_specs(coll))
+
+
+def restore_collection(saved, exists=True):
+    """
+    Replace the collection from which saved was made with the
+    documents in saved. The ``$out`` stage retains the indexes of
+    an existing collection, so only one that no longer ``exists``
+    has its indexes recreated. Capped collections are not supported.
+    """
+    name = saved.name[len(snapshot_prefix) :]
+    saved.aggregate([{'$out': name}])
+    exists or _create_indexes(saved.database[name], _index_specs(saved))
+
+
+def snapshot_all_databases(client, max_workers=None, prefix=''):
+    """
+    Concurrently snapshot every collection in every database
+    (whose name starts with prefix), for later restoration by
+    :func:`restore_all_databases`.
+    """
+    infos = _all_collection_infos(client, server_databases, max_workers, prefix)
+    tasks = (
+        (coll.full_name, functools.partial(snapshot_collection, coll))
+        for coll, info in infos
+        if not _is_view(info)
+    )
+    return run_all(client, tasks, max_workers)
+
+
+def _restore_tasks(db):
+    """
+    Generate the tasks to restore db to its snapshot, dropping
+    collections created since then.
+    """
+    names = set(db.list_collection_names())
+    saved = {name for name in names if name.startswith(snapshot_prefix)}
+    restored = {name[len(snapshot_prefix) :] for name in saved}
+    for coll, info in collection_infos(db):
+        if coll.name not in restored and not _is_view(info):
+            yield coll.full_name, functools.partial(drop_collection, coll)
+    for name in saved:
+        exists = name[len(snapshot_prefix) :] in names
+        yield (
+            db[name].full_name,
+            functools.partial(restore_collection, db[name], exists=exists),
+        )
+
+
+def restore_all_databases(client, max_workers=None, prefix=''):
+    """
+    Concurrently restore every database (whose name starts with
+    prefix) to the state saved by :func:`snapshot_all_databases`.
+    """
+    databases = all_databases(client, server_databases, prefix)
+    tasks = (task for db in databases for task in _restore_tasks(db))
+    return run_all(client, tasks, max_workers)
@@ -7,11 +7,31 @@ for migrating documents to a target version through
 a series of migration functions.
 '''
 
-import itertools
+import collections
+import copy
+import logging
+import queue
 import re
-from typing import Callable
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any, Callable, NamedTuple
 
-from more_itertools import recipes
+import more_itertools
+import pymongo.errors
+import pymongo.results
+from pymongo import ReplaceOne
+
+from jaraco.functools import Throttler
+
+log = logging.getLogger(__name__)
+
+
+class BatchResult(NamedTuple):
+    last_id: Any
+    "the _id of the last document in the batch, from which to resume"
+
+    result: pymongo.results.BulkWriteResult
 
 
 class Manager:
@@ -57,10 +77,12 @@ class Manager:
     """
 
     version_attribute_name = 'version'
-    _upgrade_funcs: set[Callable] = set()
+    _upgrade_funcs: dict[int, dict[int, Callable]] = collections.defaultdict(dict)
+    "registered functions by source version, then by target version"
 
     def __init__(self, target_version):
         self.target_version = target_version
+        self._plans = {}
 
     @classmethod
     def register(cls, func):
@@ -69,7 +91,7 @@ class Manager:
         to make it available for migrating cases.
         """
         cls._add_version_info(func)
-        cls._upgrade_funcs.add(func)
+        cls._upgrade_funcs[func.source][func.target] = func
         return func
 
     @staticmethod
@@ -89,15 +111,64 @@ class Manager:
         and return it.
         """
         orig_ver = doc.get(self.version_attribute_name, 0)
-        funcs = self._get_migrate_funcs(orig_ver, self.target_version)
-        for func in funcs:
+        for func in self._get_plan(orig_ver):
             func(self, doc)
             doc[self.version_attribute_name] = func.target
         return doc
 
+    def migrate_collection(
+        self,
+        coll,
+        batch_size=1000,
+        resume_after=None,
+        executor=None,
+        max_rate=float('inf'),
+    ):
+        """
+        Migrate the documents in coll below the target version in
+        order of _id, writing each batch back in one ``bulk_write``.
+        Each replacement is guarded by the document's original version,
+        so a document changed in the meantime is left alone.
+
+        Generate a :class:`BatchResult` for each batch. To resume an
+        interrupted migration, pass the ``last_id`` of the last
+        batch as ``resume_after``.
+
+        Supply an ``executor`` (such as a ``ProcessPoolExecutor``)
+        to run CPU-heavy migration functions in parallel, and a
+        ``max_rate`` to limit the documents migrated per second.
+        """
+        name = self.version_attribute_name
+        filter = {name: {'$not': {'$gte': self.target_version}}}
+        if resume_after is not None:
+            filter['_id'] = {'$gt': resume_after}
+        docs = coll.find(filter, sort=[('_id', 1)], batch_size=batch_size)
+        migrate = executor.map if executor else map
+        write = Throttler(coll.bulk_write, max_rate / batch_size)
+        for batch in more_itertools.chunked(docs, batch_size):
+            guards = [{'_id': doc['_id'], name: doc.get(name)} for doc in batch]
+            migrated = migrate(self.migrate_doc, batch)
+            requests = list(map(ReplaceOne, guards, migrated))
+            yield BatchResult(batch[-1]['_id'], write(requests, ordered=False))
+
+    def _get_plan(self, orig_version):
+        """
+        Return the functions to migrate from orig_version to the
+        target version, computed once for each orig_version.
+        Migrations registered after the plan is computed are not
+        reflected.
+        """
+        if orig_version not in self._plans:
+            funcs = self._get_migrate_funcs(orig_version, self.target_version)
+            self._plans[orig_version] = funcs
+        return self._plans[orig_version]
+
     @classmethod
     def _get_migrate_funcs(cls, orig_version, target_version):
         """
+        Return the shortest sequence of functions to migrate
+        from orig_version to target_version.
+
         >>> @Manager.register
         ... def v1_to_2(manager, doc):
         ...     doc['foo'] = 'bar'
@@ -118,27 +189,190 @@ class Manager:
         >>> funcs == [v2_to_1]
         True
 
+        A migration that skips versions is preferred.
+
+        >>> @Manager.register
+        ... def v1_to_3(manager, doc):
+        ...     doc['foo'] = 'bar baz'
+        >>> Manager._get_migrate_funcs(1, 3) == (v1_to_3,)
+        True
+
+        >>> Manager._get_migrate_funcs(3, 1)
+        Traceback (most recent call last):
+        ...
+        ValueError: No migration from 3 to 1
+
         >>> Manager._upgrade_funcs.clear()
         """
-        direction = 1 if target_version > orig_version else -1
-        versions = range(orig_version, target_version + direction, direction)
-        transitions = recipes.pairwise(versions)
-        return itertools.starmap(cls._get_func, transitions)
+        # breadth-first search, visiting targets nearest the goal first
+        plans: dict[int, tuple[Callable, ...]] = {orig_version: ()}
+        pending = collections.deque([orig_version])
+        while pending and target_version not in plans:
+            source = pending.popleft()
+            steps = cls._upgrade_funcs.get(source, {})
+            for target in sorted(steps, key=lambda ver: abs(target_version - ver)):
+                if target not in plans:
+                    plans[target] = plans[source] + (steps[target],)
+                    pending.append(target)
+        try:
+            return plans[target_version]
+        except KeyError:
+            raise ValueError(
+                f"No migration from {orig_version} to {target_version}"
+            ) from None
 
-    @classmethod
-    def _get_func(cls, source_ver, target_ver):
+
+class MigratingCollection:
+    """
+    Wrap a collection such that the documents returned by
+    ``find`` and ``find_one`` are migrated by the manager
+    as they're read.
+
+    Documents so upgraded are queued and written back by a
+    background thread in batches of ``batch_size`` (or whatever has
+    accumulated after ``flush_interval`` seconds), each replacement
+    guarded by the document's original version. Documents read
+    with a projection are migrated but never written back.
+
+    Call :meth:`close` (or use as a context manager) to flush
+    pending writes; documents upgraded after that are written back
+    immediately. Other attributes are those of the collection.
+    """
+
+    _stop = object()
+
+    def __init__(self, manager, collection, batch_size=100, flush_interval=1.0):
+        self.manager = manager
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def find(self, *args, **kwargs):
+        projection = kwargs.get('projection', args[1] if len(args) > 1 else None)
+        cursor = self.collection.find(*args, **kwargs)
+        return MigratingCursor(self, cursor, write_back=not projection)
+
+    def find_one(self, filter=None, *args, **kwargs):
+        if filter is not None and not isinstance(filter, Mapping):
+            filter = {'_id': filter}
+        return next(self.find(filter, *args, **kwargs).limit(-1), None)
+
+    def migrate(self, doc, write_back=True):
         """
-        Return exactly one function to convert from source to target
+        Migrate the doc, queuing it to be written back
+        if it was upgraded.
         """
-        matches = (
-            func
-            for func in cls._upgrade_funcs
-            if func.source == source_ver and func.target == target_ver
-        )
+        name = self.manager.version_attribute_name
+        orig_version = doc.get(name)
+        self.manager.migrate_doc(doc)
+        if write_back and doc.get(name) != orig_version:
+            guard = {'_id': doc['_id'], name: orig_version}
+            # copy to isolate the write from subsequent changes by the caller
+            self._enqueue(ReplaceOne(guard, copy.deepcopy(doc)))
+        return doc
+
+    def _enqueue(self, request):
+        with self._lock:
+            # queue under the lock, so nothing follows the stop sentinel
+            if not self._closed:
+                self._pending.put(request)
+                if not self._writer:
+                    self._writer = threading.Thread(
+                        target=self._write_loop, daemon=True
+                    )
+                    self._writer.start()
+                return
+        self._write([request])
+
+    def _write_loop(self):
+        stopped = False
+        while not stopped:
+            batch = self._next_batch()
+            stopped = self._stop in batch
+            requests = [request for request in batch if request is not self._stop]
+            requests and self._write(requests)
+
+    def _next_batch(self):
+        """
+        Block for the next request, then gather more until the batch
+        is full, flush_interval elapses, or the writer is stopped.
+        """
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not self._stop:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                batch.append(self._pending.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, requests):
         try:
-            (match,) = matches
-        except ValueError:
-            raise ValueError(
-                f"No migration from {source_ver} to {target_ver}"
-            ) from None
-        return match
+            self.collection.bulk_write(requests, ordered=False)
+        except pymongo.errors.PyMongoError:
+            log.exception("Failed to write back %d migrated documents", len(requests))
+
+    def close(self):
+        """
+        Write any pending documents and stop the writer.
+        """
+        with self._lock:
+            writer, self._writer = self._writer, None
+            self._closed = True
+            if writer:
+                self._pending.put(self._stop)
+        if writer:
+            writer.join()
+
+
+class MigratingCursor:
+    """
+    A cursor that migrates documents as they're iterated.
+    Other attributes are those of the wrapped cursor.
+    """
+
+    def __init__(self, collection, cursor, write_back=True):
+        self.collection = collection
+        self.cursor = cursor
+        self.write_back = write_back
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.collection.migrate(next(self.cursor), self.write_back)
+
+    next = __next__
+
+    def clone(self):
+        return type(self)(self.collection, self.cursor.clone(), self.write_back)
+
+    def to_list(self, length=None):
+        docs = self.cursor.to_list(length)
+        return [self.collection.migrate(doc, self.write_back) for doc in docs]
+
+    def __getattr__(self, name):
+        attr = getattr(self.cursor, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            # keep chained cursor methods (sort, limit, ...) wrapped
+            return self if result is self.cursor else result
+
+        return wrapper
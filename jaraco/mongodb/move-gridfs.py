@@ -20,18 +20,23 @@ True
 
 from __future__ import annotations
 
+import concurrent.futures
 import datetime
-import itertools
 import logging
+import pathlib
 import signal
 import sys
+import threading
 from typing import Annotated
 
 import bson
+import bson.json_util
 import dateutil.parser
 import gridfs
 import typer
+from more_itertools import chunked, constrained_batches
 from more_itertools.recipes import consume
+from pymongo import ReplaceOne, UpdateOne
 
 from jaraco.mongodb import helper
 from jaraco.ui import progress
@@ -46,6 +51,21 @@ class FileMove:
     limit = None
     limit_date = None
 
+    workers = 1
+    "number of files to move concurrently"
+
+    batch_size = 100
+    "number of file documents to fetch (or move server-side) at once"
+
+    chunk_batch_bytes = 16 * 1024**2
+    "maximum bytes of chunk data to insert in one request"
+
+    server_side = False
+    "copy the data with ``$merge`` when source and dest share a cluster"
+
+    journal = None
+    "a record of files moved, which are skipped if the move is resumed"
+
     def __init__(self, **params):
         vars(self).update(**params)
 
@@ -53,11 +73,12 @@ class FileMove:
         """
         Create the same indexes that the GridFS API would have
         """
-        self.dest_gfs.new_file()._GridIn__ensure_indexes()
+        helper.ensure_gridfs_indexes(self.dest_coll)
 
     @property
     def filter(self):
-        filter = {}
+        # files sharing chunks (see dedup-gridfs) can't be moved by id
+        filter = {'metadata.blob': {'$exists': False}}
         if self.include:
             filter.update(filename={"$regex": self.include})
         if self.limit_date:
@@ -67,29 +88,155 @@ class FileMove:
 
     @property
     def source_coll(self):
-        return self.source_gfs._GridFS__collection
+        return helper.gridfs_collection(self.source_gfs)
 
     @property
     def dest_coll(self):
-        return self.dest_gfs._GridFS__collection
+        return helper.gridfs_collection(self.dest_gfs)
+
+    @property
+    def same_cluster(self):
+        return self.source_coll.database.client == self.dest_coll.database.client
 
     def run(self, bar=progress.TargetProgressBar):
+        if self.server_side and not self.same_cluster:
+            log.warning("Source and dest differ; moving through the client")
+        server_side = self.server_side and self.same_cluster
+        shared = {'metadata.blob': {'$exists': True}}
+        if self.source_coll.files.count_documents(shared, limit=1):
+            log.warning("Skipping deduplicated files, which can't be moved")
         files = self.source_coll.files.find(
             self.filter,
-            batch_size=1,
+            projection=['_id'] if server_side else None,
+            batch_size=self.batch_size,
+            limit=self.limit or 0,
         )
-        limit_files = itertools.islice(files, self.limit)
-        count = min(files.count(), self.limit or float('inf'))
+        count_limit = dict(limit=self.limit) if self.limit else {}
+        count = self.source_coll.files.count_documents(self.filter, **count_limit)
         progress = bar(count).iterate if bar else iter
-        with SignalTrap(progress(limit_files)) as items:
-            consume(map(self.process, items))
+        move = self.run_server_side if server_side else self.run_client_side
+        with SignalTrap(progress(files)) as items:
+            move(self._unmoved(items))
+
+    def _unmoved(self, files):
+        """
+        Skip the files the journal records as moved (deleting them
+        from the source if they were not already).
+        """
+        if not self.journal:
+            yield from files
+            return
+        for batch in chunked(files, self.batch_size):
+            moved = self.journal.moved([file['_id'] for file in batch])
+            yield from (file for file in batch if file['_id'] not in moved)
+            if self.delete and moved:
+                self._delete(list(moved))
+
+    def _record(self, ids):
+        self.journal and self.journal.record(ids)
+        self.delete and self._delete(ids)
+
+    def _delete(self, ids):
+        self.source_coll.files.delete_many(dict(_id={'$in': ids}))
+        self.source_coll.chunks.delete_many(dict(files_id={'$in': ids}))
+
+    def run_client_side(self, files):
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            consume(helper.bounded_map(executor, self.process, files, self.workers * 2))
 
     def process(self, file):
-        chunks = self.source_coll.chunks.find(dict(files_id=file['_id']))
-        for chunk in chunks:
-            self.dest_coll.chunks.insert(chunk)
-        self.dest_coll.files.insert(file)
-        self.delete and self.source_gfs.delete(file['_id'])
+        chunks = self.source_coll.chunks.find(
+            dict(files_id=file['_id']),
+            sort=[('n', 1)],
+        )
+        batches = constrained_batches(
+            chunks,
+            self.chunk_batch_bytes,
+            get_len=lambda chunk: len(chunk['data']),
+            strict=False,
+        )
+        # upsert, so that a partial copy from an interrupted move is repaired
+        for batch in batches:
+            upserts = [
+                ReplaceOne(dict(_id=chunk['_id']), chunk, upsert=True)
+                for chunk in batch
+            ]
+            self.dest_coll.chunks.bulk_write(upserts)
+        self.dest_coll.files.replace_one(dict(_id=file['_id']), file, upsert=True)
+        self._record([file['_id']])
+
+    def run_server_side(self, files):
+        """
+        Move the files in batches, having the server copy the
+        chunks, then the files, with ``$merge``.
+        """
+        for batch in chunked(files, self.batch_size):
+            ids = [file['_id'] for file in batch]
+            self._merge(self.source_coll.chunks, dict(files_id={'$in': ids}))
+            self._merge(self.source_coll.files, dict(_id={'$in': ids}))
+            self._record(ids)
+
+    def _merge(self, source, filter):
+        """
+        Copy the matching documents from the source subcollection
+        (files or chunks) to the same subcollection in the destination.
+        """
+        dest = self.dest_coll[source.name.rpartition('.')[-1]]
+        into = dict(db=dest.database.name, coll=dest.name)
+        merge = dict(into=into, whenMatched='replace')
+        source.aggregate([{'$match': filter}, {'$merge': merge}])
+
+
+class CollectionJournal:
+    """
+    A journal of moved files kept in a collection
+    (by default, alongside the destination files).
+    """
+
+    def __init__(self, coll):
+        self.coll = coll
+
+    @classmethod
+    def for_dest(cls, dest_gfs):
+        return cls(helper.gridfs_collection(dest_gfs)['moved'])
+
+    def moved(self, ids):
+        query = dict(_id={'$in': ids})
+        return {doc['_id'] for doc in self.coll.find(query, projection=['_id'])}
+
+    def record(self, ids):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        updates = [
+            UpdateOne(dict(_id=id), {'$set': dict(moved=now)}, upsert=True)
+            for id in ids
+        ]
+        self.coll.bulk_write(updates)
+
+
+class FileJournal:
+    """
+    A journal of moved files kept in a local file,
+    one Extended JSON id per line.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.lock = threading.Lock()
+        lines = self.path.read_text().splitlines() if self.path.exists() else []
+        self._moved = set(map(self._load, lines))
+
+    @staticmethod
+    def _load(line):
+        return bson.json_util.loads(line)['_id']
+
+    def moved(self, ids):
+        return self._moved.intersection(ids)
+
+    def record(self, ids):
+        lines = (bson.json_util.dumps(dict(_id=id)) + '\n' for id in ids)
+        with self.lock, self.path.open('a') as strm:
+            strm.writelines(lines)
+        self._moved.update(ids)
 
 
 class SignalTrap:
@@ -136,9 +283,25 @@ def run(
             parser=dateutil.parser.parse, help='only move files older than this date'
         ),
     ] = None,
+    workers: Annotated[int, typer.Option(help="files to move concurrently")] = 1,
+    server_side: Annotated[
+        bool,
+        typer.Option(help="copy server-side with $merge when in the same cluster"),
+    ] = False,
+    journal_file: Annotated[
+        pathlib.Path | None,
+        typer.Option(
+            help="journal moved files here rather than in the destination database"
+        ),
+    ] = None,
 ):
     logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 
+    journal = (
+        FileJournal(journal_file)
+        if journal_file
+        else CollectionJournal.for_dest(dest_gfs)
+    )
     mover = FileMove(**locals())
     mover.ensure_indexes()
     mover.run()
@@ -3,14 +3,12 @@ import collections
 import datetime
 import json
 import logging
-import operator
 import re
 import time
 from importlib import metadata
 from typing import Any
 
 import bson.json_util
-import cachetools
 import pymongo
 import pytimeparse
 from pymongo.cursor import CursorType
@@ -456,7 +454,6 @@ def apply(db, op):
     return _get_index_handler(db)(_db, op) or _apply_regular(_db, op)
 
 
-@cachetools.cached({}, key=operator.attrgetter('address'))
 def _get_index_handler(conn):
     def _bypass(db, op):
         pass
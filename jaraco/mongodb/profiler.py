@@ -0,0 +1,265 @@
+"""
+A pytest plugin that profiles the MongoDB operations issued by each
+test, reporting (or failing the test on) collection scans for
+filtered queries and slow operations.
+
+Enable it with ``--mongodb-profile=report`` (to summarize the
+operations at the end of the session) or ``--mongodb-profile=fail``
+(to fail the tests that issue them). Operations are slow if
+they take at least ``--mongodb-slow-ms`` milliseconds.
+
+Tests are profiled when they use the ``mongodb_instance`` fixture.
+Ephemeral instances run with the profiler on for every database.
+On an extant instance, the profiler is turned on for each database
+when a test first sends it a command, and is restored to its
+previous level at the end of the session.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import re
+from typing import NamedTuple
+
+import pymongo.errors
+import pymongo.monitoring
+import pytest
+
+from . import helper
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--mongodb-profile',
+        choices=['report', 'fail'],
+        help="Report (or fail tests on) collection scans and slow MongoDB operations",
+    )
+    parser.addoption(
+        '--mongodb-slow-ms',
+        type=int,
+        default=100,
+        help="Milliseconds at which a MongoDB operation is slow (default 100)",
+    )
+
+
+def pytest_configure(config):
+    mode = config.getoption('mongodb_profile')
+    if mode:
+        profiler = Profiler(mode, config.getoption('mongodb_slow_ms'))
+        pymongo.monitoring.register(profiler.listener)
+        config.pluginmanager.register(profiler, 'mongodb-profiler')
+
+
+def _shape(value):
+    """
+    The shape of a query, without its values.
+
+    >>> _shape({'a': 1, 'b': {'$in': [1, 2]}, '$or': [{'c': 'x'}]})
+    {'a': 1, 'b': {'$in': 1}, '$or': [{'c': 1}]}
+    """
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+        return list(map(_shape, value))
+    return 1
+
+
+def _filter(command):
+    """
+    The filter for the operation in the command (if any).
+
+    >>> _filter({'find': 'things', 'filter': {'a': 1}})
+    {'a': 1}
+    >>> _filter({'aggregate': 'things', 'pipeline': [{'$match': {'a': 1}}]})
+    {'a': 1}
+    >>> _filter({'delete': 'things', 'q': {'a': 1}})
+    {'a': 1}
+    >>> _filter({'find': 'things'})
+    {}
+    """
+    pipeline = command.get('pipeline') or [{}]
+    return (
+        command.get('filter')
+        or command.get('query')
+        or command.get('q')
+        or pipeline[0].get('$match')
+        or {}
+    )
+
+
+class Finding(NamedTuple):
+    ns: str
+    op: str
+    plan: str
+    keys_examined: int
+    docs_examined: int
+    millis: int
+    shape: dict
+
+    @classmethod
+    def from_profile(cls, entry):
+        return cls(
+            ns=entry['ns'],
+            op=entry['op'],
+            plan=entry.get('planSummary', ''),
+            keys_examined=entry.get('keysExamined', 0),
+            docs_examined=entry.get('docsExamined', 0),
+            millis=entry.get('millis', 0),
+            shape=_shape(_filter(entry.get('command', {}))),
+        )
+
+    def __str__(self):
+        return (
+            f"{self.op} {self.ns} {self.shape} {self.plan} "
+            f"(keys {self.keys_examined}, docs {self.docs_examined}, "
+            f"{self.millis}ms)"
+        )
+
+
+class _DatabaseListener(pymongo.monitoring.CommandListener):
+    """
+    Track the databases to which commands are sent, notifying
+    ``discovered`` of each not yet seen.
+    """
+
+    def __init__(self, discovered):
+        self.databases = set()
+        self.discovered = discovered
+
+    def started(self, event):
+        if event.database_name in self.databases:
+            return
+        self.databases.add(event.database_name)
+        self.discovered(event.database_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class Profiler:
+    unprofiled = {'admin', 'local', 'config'}
+
+    def __init__(self, mode, slow_ms):
+        self.mode = mode
+        self.slow_ms = slow_ms
+        self.listener = _DatabaseListener(self.discovered)
+        self.client = None
+        self.enabled = {}
+        self.reported = {}
+
+    @staticmethod
+    def _client(item):
+        instance = getattr(item, 'funcargs', {}).get('mongodb_instance')
+        return instance and helper.clients.get(instance.get_uri())
+
+    @staticmethod
+    def _server_time(client):
+        return client.admin.command('hello')['localTime']
+
+    def discovered(self, name):
+        """
+        Turn on the profiler for a database first used during a test.
+        """
+        if self.client:
+            self._enable(self.client, {name})
+
+    def _enable(self, client, databases):
+        """
+        Turn on the profiler for the databases, if not already,
+        noting each one's previous level.
+        """
+        for name in databases - self.unprofiled:
+            key = id(client), name
+            if key not in self.enabled:
+                self.enabled[key] = client, client[name].command('profile', 2)['was']
+
+    def pytest_unconfigure(self, config):
+        """
+        Restore the profiling level of each database profiled.
+        (Those already profiled, such as on ephemeral instances
+        that may have since stopped, are left alone.)
+        """
+        for (_, name), (client, was) in self.enabled.items():
+            if was == 2:
+                continue
+            with contextlib.suppress(pymongo.errors.PyMongoError):
+                client[name].command('profile', was)
+
+    def collect(self, client, databases, start, end):
+        """
+        Return the findings for operations in the databases
+        between start and end (in server time).
+        """
+        flagged = {
+            'ts': {'$gte': start, '$lte': end},
+            'ns': {'$not': re.compile(r'\.system\.profile$')},
+            '$or': [
+                {'planSummary': re.compile('COLLSCAN')},
+                {'millis': {'$gte': self.slow_ms}},
+            ],
+        }
+        entries = (
+            entry
+            for name in sorted(databases - self.unprofiled)
+            for entry in client[name].system.profile.find(flagged)
+        )
+        return [
+            Finding.from_profile(entry)
+            for entry in entries
+            if entry.get('millis', 0) >= self.slow_ms
+            or _filter(entry.get('command', {}))
+        ]
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item):
+        self.listener.databases.clear()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        client = self._client(item)
+        if not client:
+            yield
+            return
+        self._enable(client, set(self.listener.databases))
+        self.listener.databases.clear()
+        start = self._server_time(client)
+        self.client = client
+        try:
+            yield
+        finally:
+            self.client = None
+        databases = set(self.listener.databases)
+        item._mongodb_findings = self.collect(
+            client, databases, start, self._server_time(client)
+        )
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        outcome = yield
+        report = outcome.get_result()
+        findings = call.when == 'call' and getattr(item, '_mongodb_findings', None)
+        if not findings:
+            return
+        report.user_properties.append(('mongodb_profile', list(map(str, findings))))
+        if self.mode == 'fail' and report.passed:
+            report.outcome = 'failed'
+            report.longrepr = "MongoDB operations flagged by the profiler:\n" + (
+                "\n".join(map(str, findings))
+            )
+
+    def pytest_runtest_logreport(self, report):
+        for name, findings in report.user_properties:
+            if name == 'mongodb_profile':
+                self.reported[report.nodeid] = findings
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.reported:
+            return
+        terminalreporter.write_sep('=', "MongoDB profile")
+        for nodeid, findings in self.reported.items():
+            terminalreporter.write_line(nodeid)
+            for finding in findings:
+                terminalreporter.write_line(f"    {finding}")
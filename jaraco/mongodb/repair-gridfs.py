@@ -1,7 +1,12 @@
 """
 Script to repair broken GridFS files. It handles
 
-- Removing files with missing chunks.
+- Removing files whose chunks are missing or don't match the file.
+- Removing orphaned chunks.
+
+Affected files and chunks are first saved to the ``-saved``
+collections alongside the bucket. Deduplicated files (see
+``dedup-gridfs``) are reported but never removed.
 """
 
 import logging
@@ -10,58 +15,75 @@ from typing import Annotated
 
 import gridfs
 import typer
+from more_itertools import chunked
 from more_itertools.recipes import consume
 
-from jaraco.context import ExceptionTrap
 from jaraco.itertools import Counter
-from jaraco.mongodb import helper
-from jaraco.ui import progress
+from jaraco.mongodb import helper, integrity
 from jaraco.ui.main import main
 
 log = logging.getLogger()
 
 
 class FileRepair:
+    batch_size = 1000
+    dry_run = False
+
     def __init__(self, gfs):
         self.gfs = gfs
-        db = gfs._GridFS__database
-        coll = gfs._GridFS__collection
-        bu_coll_name = coll.name + '-saved'
-        self.backup_coll = db[bu_coll_name]
+        self.coll = helper.gridfs_collection(gfs)
+        bu_coll_name = self.coll.name + '-saved'
+        self.backup_coll = self.coll.database[bu_coll_name]
 
     def run(self):
-        files = self.gfs.list()
-        bar = progress.TargetProgressBar(len(files))
-        processed_files = map(self.process, bar.iterate(files))
-        errors = filter(None, processed_files)
-        counter = Counter(errors)
-        consume(map(self.handle_trap, counter))
-        return counter
-
-    def process(self, filename):
-        file = self.gfs.get_last_version(filename)
-        with ExceptionTrap(gridfs.errors.CorruptGridFile) as trap:
-            file.read(1)
-        trap.filename = filename
-        return trap
-
-    def handle_trap(self, trap):
-        cls, exc, tb = trap.exc_info
-        spec = dict(filename=trap.filename)
-        for file_doc in self.gfs._GridFS__files.find(spec):
-            self.backup_coll.files.insert(file_doc)
-            chunk_spec = dict(files_id=file_doc['_id'])
-            for chunk in self.gfs._GridFS__chunks.find(chunk_spec):
-                self.backup_coll.chunks.insert(chunk)
-        log.info("Removing %s (%s)", trap.filename, exc)
-        self.gfs.delete(spec)
+        problems = Counter(integrity.find_problems(self.coll))
+        consume(map(self.repair, chunked(problems, self.batch_size)))
+        return problems
+
+    def repair(self, problems):
+        verb = "Would remove" if self.dry_run else "Removing"
+        for problem in problems:
+            log.info("%s %s", verb, problem)
+        if self.dry_run:
+            return
+        ids = self._unshared([problem.files_id for problem in problems])
+        self._backup(self.coll.files, dict(_id={'$in': ids}))
+        self._backup(self.coll.chunks, dict(files_id={'$in': ids}))
+        self.coll.files.delete_many(dict(_id={'$in': ids}))
+        self.coll.chunks.delete_many(dict(files_id={'$in': ids}))
+
+    def _unshared(self, ids):
+        """
+        Exclude from the ids those of deduplicated files.
+        """
+        query = {'_id': {'$in': ids}, 'metadata.blob': {'$exists': True}}
+        shared = {doc['_id'] for doc in self.coll.files.find(query, ['_id'])}
+        for id in shared:
+            log.warning("Skipping deduplicated file %s", id)
+        return [id for id in ids if id not in shared]
+
+    def _backup(self, source, filter):
+        """
+        Copy the matching documents from the subcollection
+        (files or chunks) to the same subcollection in the backup.
+        """
+        backup = self.backup_coll[source.name.rpartition('.')[-1]]
+        merge = dict(into=backup.name, whenMatched='replace')
+        source.aggregate([{'$match': filter}, {'$merge': merge}])
 
 
 @main
-def run(db: Annotated[gridfs.GridFS, typer.Argument(parser=helper.connect_gridfs)]):
+def run(
+    db: Annotated[gridfs.GridFS, typer.Argument(parser=helper.connect_gridfs)],
+    dry_run: Annotated[
+        bool, typer.Option(help="Report what would be removed, but remove nothing")
+    ] = False,
+):
     logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 
     repair = FileRepair(db)
+    repair.dry_run = dry_run
     counter = repair.run()
 
-    log.info("Removed %s corrupt files.", counter.count)
+    verb = "Would remove" if dry_run else "Removed"
+    log.info("%s %s corrupt files.", verb, counter.count)
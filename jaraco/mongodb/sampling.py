@@ -1,5 +1,16 @@
 import builtins
+import collections
+import concurrent.futures
+import math
+import statistics
+import threading
+import time
 from collections.abc import Mapping
+from typing import NamedTuple
+
+import bson.json_util
+import pymongo.errors
+from more_itertools.recipes import consume
 
 
 def estimate(coll, filter: Mapping = {}, sample=1):
@@ -23,12 +34,18 @@ def estimate(coll, filter: Mapping = {}, sample=1):
     >>> val = estimate(coll, filter=query, sample=.1)
     >>> val > 0
     True
+    >>> estimate(coll, filter={"val": -1}, sample=10)
+    0
+    >>> empty = getfixture('database').empty
+    >>> estimate(empty, filter=query, sample=.1)
+    0
     """
     total = coll.estimated_document_count()
     if not filter and sample == 1:
         return total
     if sample <= 1:
-        sample *= total
+        # sample at least one document, even of an empty collection
+        sample = max(int(sample * total), 1)
     pipeline = list(
         builtins.filter(
             None,
@@ -39,6 +56,313 @@ def estimate(coll, filter: Mapping = {}, sample=1):
             ],
         )
     )
-    docs = next(coll.aggregate(pipeline))
+    docs = next(coll.aggregate(pipeline), dict(matched=0))
     ratio = docs['matched'] / sample
     return int(total * ratio)
+
+
+class Estimate(NamedTuple):
+    """
+    An estimated count with its confidence interval, along
+    with the number of documents sampled and matched (both
+    zero for an exact count).
+    """
+
+    value: int
+    low: int
+    high: int
+    sampled: int = 0
+    matched: int = 0
+
+    @property
+    def exact(self):
+        return self.low == self.high
+
+    @classmethod
+    def from_sample(cls, total, sampled, matched, confidence):
+        """
+        Estimate from the sample using the Wilson score interval.
+
+        >>> Estimate.from_sample(1000, 100, 50, .95)
+        Estimate(value=500, low=403, high=597, sampled=100, matched=50)
+        >>> Estimate.from_sample(1000, 100, 0, .95).high
+        37
+        """
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        ratio = matched / sampled
+        scale = 1 + z**2 / sampled
+        center = (ratio + z**2 / (2 * sampled)) / scale
+        spread = (
+            z
+            / scale
+            * math.sqrt(ratio * (1 - ratio) / sampled + z**2 / (4 * sampled**2))
+        )
+        return cls(
+            value=round(total * ratio),
+            low=max(math.floor(total * (center - spread)), 0),
+            high=min(math.ceil(total * (center + spread)), total),
+            sampled=sampled,
+            matched=matched,
+        )
+
+    def within(self, rel_error):
+        """
+        Is the interval within rel_error of the value?
+        """
+        return (self.high - self.low) / 2 <= rel_error * max(self.value, 1)
+
+
+def _count_sample(coll, filter, size, **kwargs):
+    pipeline = [{'$sample': {'size': size}}, {'$match': filter}, {'$count': 'matched'}]
+    return next(coll.aggregate(pipeline, **kwargs), dict(matched=0))['matched']
+
+
+def _stages(plan):
+    yield plan['stage']
+    for child in plan.get('inputStages', [plan.get('inputStage')]):
+        if child:
+            yield from _stages(child)
+
+
+def index_only(coll, filter: Mapping):
+    """
+    Would counting documents matching the filter read only
+    the index (and no documents)?
+
+    >>> coll = getfixture('bulky_collection')
+    >>> index_only(coll, {"_id": {"$gte": 50}})
+    True
+    >>> index_only(coll, {"val": {"$gte": 50}})
+    False
+    """
+    cmd = {'count': coll.name, 'query': filter}
+    explanation = coll.database.command('explain', cmd, verbosity='queryPlanner')
+    winning = explanation['queryPlanner']['winningPlan']
+    # MongoDB 7 nests the plan
+    stages = set(_stages(winning.get('queryPlan', winning)))
+    return 'COUNT_SCAN' in stages and 'FETCH' not in stages
+
+
+def estimate_interval(
+    coll,
+    filter: Mapping = {},
+    rel_error=0.05,
+    confidence=0.95,
+    timeout=float('inf'),
+    initial=100,
+    use_index=True,
+) -> Estimate:
+    """
+    Estimate the number of documents in the collection matching
+    the filter, doubling the sample until the confidence interval
+    is within rel_error of the estimate or timeout seconds have
+    elapsed (though the initial sample is always taken).
+
+    If use_index and the filter can be counted from an index
+    alone, or if the sample would cover the collection, count
+    exactly instead.
+
+    >>> coll = getfixture('bulky_collection')
+    >>> estimate_interval(coll, {"_id": {"$lt": 10}})
+    Estimate(value=10, low=10, high=10, sampled=0, matched=0)
+    >>> est = estimate_interval(coll, {"val": {"$gte": 50}}, initial=10)
+    >>> est.low <= est.value <= est.high
+    True
+    >>> estimate_interval(coll, {"val": -1}, rel_error=1, initial=10).value
+    0
+    """
+    total = coll.estimated_document_count()
+    if not filter:
+        return Estimate(total, total, total)
+    if use_index and index_only(coll, filter):
+        return _exact(coll, filter)
+    deadline = time.monotonic() + timeout
+    sampled = matched = 0
+    size = initial
+    while sampled + size < total:
+        remaining = deadline - time.monotonic()
+        if sampled and remaining <= 0:
+            break
+        bounded = sampled and math.isfinite(remaining)
+        limit = dict(maxTimeMS=max(int(remaining * 1000), 1)) if bounded else {}
+        try:
+            matched += _count_sample(coll, filter, size, **limit)
+        except pymongo.errors.ExecutionTimeout:
+            break
+        sampled += size
+        result = Estimate.from_sample(total, sampled, matched, confidence)
+        if result.within(rel_error):
+            return result
+        size *= 2
+    else:
+        return _exact(coll, filter)
+    return result
+
+
+def _exact(coll, filter):
+    count = coll.count_documents(filter)
+    return Estimate(count, count, count)
+
+
+def estimate_many(coll, filters, sample=1000, confidence=0.95):
+    """
+    Estimate the number of documents matching each of the filters
+    from one shared sample, counting all matches in one pipeline.
+
+    >>> coll = getfixture('bulky_collection')
+    >>> low, high, none = estimate_many(coll, [
+    ...     {"val": {"$lt": 50}}, {"val": {"$gte": 50}}, {"val": -1}])
+    >>> low.value + high.value
+    100
+    >>> none
+    Estimate(value=0, low=0, high=0, sampled=0, matched=0)
+    >>> est = estimate_many(coll, [{"val": {"$gte": 50}}], sample=10)[0]
+    >>> est.sampled
+    10
+    """
+    total = coll.estimated_document_count()
+    facets = {
+        str(n): [{'$match': filter}, {'$count': 'n'}]
+        for n, filter in enumerate(filters)
+    }
+    facets['sampled'] = [{'$count': 'n'}]
+    pipeline = list(
+        builtins.filter(
+            None,
+            [
+                {'$sample': {'size': sample}} if sample < total else {},
+                {'$facet': facets},
+            ],
+        )
+    )
+    (result,) = coll.aggregate(pipeline)
+    counts = {name: next(iter(docs), dict(n=0))['n'] for name, docs in result.items()}
+    sampled = counts.pop('sampled')
+    if sample >= total:
+        return [
+            Estimate(counts[str(n)], counts[str(n)], counts[str(n)])
+            for n in range(len(filters))
+        ]
+    return [
+        Estimate.from_sample(total, sampled, counts[str(n)], confidence)
+        for n in range(len(filters))
+    ]
+
+
+def _key(coll, filter):
+    """
+    Key the filter for the collection, regardless of the order
+    of its top-level fields.
+    """
+    return coll.full_name, bson.json_util.dumps(dict(sorted(filter.items())))
+
+
+class EstimateCache:
+    """
+    Cache estimates by collection and filter, discarding the least
+    recently used beyond ``maxsize``. An estimate older than ``ttl``
+    seconds is returned but refreshed in the background; one older
+    than ``max_age`` is estimated anew before returning.
+
+    Params are passed to :func:`estimate_interval` (or, for
+    ``confidence``, :func:`estimate_many`).
+
+    >>> coll = getfixture('bulky_collection')
+    >>> cache = EstimateCache(use_index=False, rel_error=1)
+    >>> est = cache.get(coll, {"val": {"$gte": 50}})
+    >>> cache.get(coll, {"val": {"$gte": 50}}) is est
+    True
+    >>> many = cache.get_many(coll, [{"val": {"$gte": 50}}, {"val": -1}])
+    >>> many[0] is est
+    True
+    >>> cache.close()
+    """
+
+    ttl = 60
+    max_age = 600
+    maxsize = 1024
+    sample = 1000
+
+    def __init__(self, **params):
+        self.params = params
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+
+    def get(self, coll, filter: Mapping = {}) -> Estimate:
+        return self.get_many(coll, [filter], estimator=self._estimate_each)[0]
+
+    def get_many(self, coll, filters, estimator=None) -> list:
+        """
+        Get the estimate for each filter, estimating together
+        any not cached (or too old) in one pipeline.
+        """
+        estimator = estimator or self._estimate_all
+        keys = [_key(coll, filter) for filter in filters]
+        entries = list(map(self._lookup, keys))
+        now = time.monotonic()
+        missing = [
+            n for n, entry in enumerate(entries) if now - entry[1] > self.max_age
+        ]
+        stale = [n for n, entry in enumerate(entries) if now - entry[1] > self.ttl]
+        found = [estimate for estimate, stamp in entries]
+        if missing:
+            estimates = estimator(coll, [filters[n] for n in missing])
+            for n, estimate in zip(missing, estimates):
+                found[n] = self._store(keys[n], estimate)
+        self._refresh(
+            coll, [(keys[n], filters[n]) for n in stale if n not in missing], estimator
+        )
+        return found
+
+    def _estimate_each(self, coll, filters):
+        return [estimate_interval(coll, filter, **self.params) for filter in filters]
+
+    def _estimate_all(self, coll, filters):
+        confidence = self.params.get('confidence', 0.95)
+        return estimate_many(coll, filters, self.sample, confidence)
+
+    def _lookup(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None, -math.inf
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def _store(self, key, estimate):
+        with self.lock:
+            self.entries[key] = estimate, time.monotonic()
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return estimate
+
+    def _refresh(self, coll, items, estimator):
+        """
+        In the background, estimate anew the filters not
+        already being refreshed.
+        """
+        with self.lock:
+            items = [
+                (key, filter) for key, filter in items if key not in self.refreshing
+            ]
+            self.refreshing.update(key for key, filter in items)
+        if items:
+            self.executor.submit(self._update, coll, items, estimator)
+
+    def _update(self, coll, items, estimator):
+        keys = [key for key, filter in items]
+        try:
+            estimates = estimator(coll, [filter for key, filter in items])
+            consume(map(self._store, keys, estimates))
+        finally:
+            with self.lock:
+                self.refreshing.difference_update(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def close(self):
+        self.executor.shutdown()
@@ -1,16 +1,22 @@
+from __future__ import annotations
+
 import contextlib
 import datetime
 import functools
 import glob
+import hashlib
 import importlib
+import itertools
 import logging
 import os
 import pathlib
 import platform
+import re
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
 import typing
 import warnings
 from typing import Any
@@ -80,6 +86,51 @@ class MongoDBFinder(paths.PathFinder):
             self.stop()
 
 
+class Resettable:
+    """
+    Mix-in for instances supplying ``get_connection``, providing
+    means to reset their databases between tests.
+    """
+
+    reset_modes = dict(
+        drop=manage.drop_all_databases,
+        truncate=manage.truncate_all_databases,
+        restore=manage.restore_all_databases,
+    )
+
+    db_prefix = ''
+    """
+    prefix of the names of the databases to reset or snapshot, such
+    that workers sharing a server affect only their own databases
+    (by default, all databases)
+    """
+
+    def purge_all_databases(self, prefix=None):
+        prefix = self.db_prefix if prefix is None else prefix
+        manage.purge_all_databases(self.get_connection(), prefix=prefix)
+
+    def snapshot(self, prefix=None):
+        """
+        Save the current state of the databases (e.g. once seeded)
+        for restoration by ``reset('restore')``.
+        """
+        prefix = self.db_prefix if prefix is None else prefix
+        with self.get_connection() as client:
+            manage.snapshot_all_databases(client, prefix=prefix)
+
+    def reset(self, mode='drop', prefix=None):
+        """
+        Reset the databases, either dropping them ('drop'),
+        removing all documents but retaining collections and indexes
+        ('truncate'), or restoring the last snapshot ('restore').
+        Only databases whose names start with prefix (by default
+        ``db_prefix``) are reset.
+        """
+        prefix = self.db_prefix if prefix is None else prefix
+        with self.get_connection() as client:
+            self.reset_modes[mode](client, prefix=prefix)
+
+
 class MongoDBService(MongoDBFinder, services.Subprocess, services.Service):
     port = 27017
 
@@ -107,12 +158,25 @@ class MongoDBService(MongoDBFinder, services.Subprocess, services.Service):
         log.info('%s listening on %s', self, self.port)
 
 
-class MongoDBInstance(MongoDBFinder, services.Subprocess, services.Service):
+class MongoDBInstance(Resettable, MongoDBFinder, services.Subprocess, services.Service):
     process_kwargs: dict[str, Any] = {}
     """
     keyword arguments to Popen to control the process creation
     """
 
+    template_root: str | None = None
+    """
+    If set, a directory in which to cache initialized data directories,
+    keyed by mongod version and arguments. Each start then clones
+    a template instead of having mongod initialize an empty dbpath.
+    """
+
+    fast_storage = False
+    """
+    If True, trade durability for speed as suitable for ephemeral
+    test instances (see :func:`fast_storage_args`).
+    """
+
     def merge_mongod_args(self, add_args):
         self.port, add_args[:] = cli.extract_param('port', add_args, type=int)
         self.mongod_args = add_args
@@ -138,27 +202,83 @@ class MongoDBInstance(MongoDBFinder, services.Subprocess, services.Service):
         super().start()
         if not hasattr(self, 'port') or not self.port:
             self.port = portend.find_available_local_port()
-        self.data_dir = tempfile.mkdtemp()
+        self.data_dir = tempfile.mkdtemp(dir=self._data_parent())
+        if self.template_root:
+            _clone_tree(self._get_template(), self.data_dir)
+        cmd = self._build_command(self.data_dir, self.port)
+        self.process = subprocess.Popen(cmd, **self.process_kwargs)
+        portend.occupied('localhost', self.port, timeout=self._startup_timeout)
+        log.info(f'{self} listening on {self.port}')
+
+    def _build_command(self, data_dir, port):
         cmd = [
             self.find_binary(),
             '--dbpath',
-            self.data_dir,
+            data_dir,
             '--port',
-            str(self.port),
-        ] + list(self.mongod_args)
+            str(port),
+        ] + self._all_args()
         if hasattr(self, 'bind_ip') and '--bind_ip' not in cmd:
             cmd.extend(['--bind_ip', self.bind_ip])
-        self.process = subprocess.Popen(cmd, **self.process_kwargs)
-        portend.occupied('localhost', self.port, timeout=self._startup_timeout)
-        log.info(f'{self} listening on {self.port}')
+        return cmd
+
+    def _all_args(self):
+        storage_args = (
+            fast_storage_args(self.find_binary()) if self.fast_storage else []
+        )
+        return storage_args + list(self.mongod_args)
+
+    def _data_parent(self):
+        return ram_directory() if self.fast_storage else None
+
+    def _get_template(self):
+        """
+        Return the path to a data directory initialized by this
+        mongod with these args, creating it if necessary.
+        """
+        key = _template_key(self.find_binary(), self._all_args())
+        path = os.path.join(self.template_root, key)
+        if not os.path.isdir(path):
+            self._build_template(path)
+        return path
+
+    def _build_template(self, path):
+        """
+        Run mongod against an empty directory until it is ready,
+        shut it down cleanly, then move the result into place.
+        """
+        os.makedirs(self.template_root, exist_ok=True)
+        # stage in the template root so the final rename is atomic
+        staging = tempfile.mkdtemp(dir=self.template_root, prefix='.staging-')
+        try:
+            self._initialize(staging)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        try:
+            os.rename(staging, path)
+        except OSError:
+            # another process built the template concurrently
+            shutil.rmtree(staging)
+        log.info(f'{self} built template {path}')
+
+    def _initialize(self, data_dir):
+        """
+        Run mongod against the data directory until it is ready.
+        """
+        port = portend.find_available_local_port()
+        cmd = self._build_command(data_dir, port)
+        process = subprocess.Popen(cmd, **self.process_kwargs)
+        try:
+            portend.occupied('localhost', port, timeout=self._startup_timeout)
+        finally:
+            process.terminate()
+            process.wait()
 
     def get_connection(self):
         pymongo = importlib.import_module('pymongo')
         return pymongo.MongoClient('localhost', self.port)
 
-    def purge_all_databases(self):
-        manage.purge_all_databases(self.get_connection())
-
     def get_connect_hosts(self):
         return [f'localhost:{self.port}']
 
@@ -171,7 +291,77 @@ class MongoDBInstance(MongoDBFinder, services.Subprocess, services.Service):
         del self.data_dir
 
 
-class ExtantInstance:
+@functools.lru_cache(maxsize=None)
+def _mongod_version(binary):
+    return subprocess.check_output([binary, '--version'], text=True)
+
+
+def _parse_version(version_output):
+    """
+    >>> _parse_version('db version v7.0.2\\nBuild Info: ...')
+    (7, 0, 2)
+    """
+    match = re.search(r'version v(\d+)\.(\d+)\.(\d+)', version_output)
+    return tuple(map(int, match.groups()))
+
+
+def ram_directory():
+    """
+    Return a RAM-backed directory suitable for data files if one
+    is available, or None to indicate the default temp directory.
+    """
+    candidates = ['/dev/shm']
+    return next(
+        (path for path in candidates if os.access(path, os.W_OK | os.X_OK)),
+        None,
+    )
+
+
+def fast_storage_args(binary, replica_set=False):
+    """
+    Return mongod arguments that trade durability for speed and
+    memory, suitable only for disposable data:
+
+    - disable journaling where the server still allows it (before 6.1,
+      and never for replica set members), or otherwise defer journal
+      flushes as long as possible,
+    - checkpoint rarely, and
+    - limit the WiredTiger cache to its minimum size.
+    """
+    version = _parse_version(_mongod_version(binary))
+    nojournal = version < (6, 1) and not replica_set
+    journal_args = ['--nojournal'] if nojournal else ['--journalCommitInterval', '500']
+    return journal_args + [
+        '--setParameter',
+        'syncdelay=3600',
+        '--wiredTigerCacheSizeGB',
+        '0.25',
+    ]
+
+
+def _template_key(binary, args):
+    """
+    Return a key unique to the mongod version and the args
+    (which may affect the data format) for a data directory.
+    """
+    spec = '\0'.join([_mongod_version(binary), *args])
+    return hashlib.sha256(spec.encode('utf-8')).hexdigest()[:16]
+
+
+def _clone_tree(src, dest):
+    """
+    Copy the contents of src into the extant directory dest, using
+    copy-on-write clones (reflinks) where the filesystem supports them.
+    """
+    if platform.system() == 'Linux':
+        cmd = ['cp', '-a', '--reflink=auto', os.path.join(src, '.'), dest]
+        with contextlib.suppress(OSError, subprocess.CalledProcessError):
+            subprocess.check_call(cmd)
+            return
+    shutil.copytree(src, dest, dirs_exist_ok=True)
+
+
+class ExtantInstance(Resettable):
     def __init__(self, uri):
         self.uri = uri
 
@@ -183,7 +373,7 @@ class ExtantInstance:
         return self.uri
 
 
-class MongoDBReplicaSet(MongoDBFinder, services.Service):
+class MongoDBReplicaSet(Resettable, MongoDBFinder, services.Service):
     replica_set_name = 'test'
 
     mongod_parameters = (
@@ -191,10 +381,33 @@ class MongoDBReplicaSet(MongoDBFinder, services.Service):
         '10',
     )
 
+    member_count = 3
+    "number of data-bearing members"
+
+    arbiter_count = 0
+    "number of arbiters, in addition to the members"
+
+    startup_timeout = datetime.timedelta(seconds=50)
+    "time to allow each member to begin accepting connections"
+
+    ready_pattern = re.compile('waiting for connections', re.IGNORECASE)
+    "log output indicating a member is accepting connections"
+
+    fast_storage = False
+    """
+    If True, trade durability for speed as suitable for ephemeral
+    test instances (see :func:`fast_storage_args`).
+    """
+
     def start(self):
         super().start()
-        self.data_root = tempfile.mkdtemp()
-        self.instances = list(map(self.start_instance, range(3)))
+        data_parent = ram_directory() if self.fast_storage else None
+        self.data_root = tempfile.mkdtemp(dir=data_parent)
+        # launch all members before waiting on any of them
+        count = self.member_count + self.arbiter_count
+        self.instances = list(map(self.start_instance, range(count)))
+        for number, instance in enumerate(self.instances):
+            self.wait_for_instance(number, instance)
         # initialize the replica set
         self.instances[0].connect().admin.command(
             'replSetInitiate', self.build_config()
@@ -206,19 +419,20 @@ class MongoDBReplicaSet(MongoDBFinder, services.Service):
         errors = importlib.import_module('pymongo.errors')
         log.info('Waiting for replica set to initialize')
 
+        delays = (min(0.05 * 2**attempt, 1.0) for attempt in itertools.count())
         watch = timing.Stopwatch()
         while watch.elapsed < datetime.timedelta(minutes=5):
-            try:
-                res = get_repl_set_status()
-                if res.get('myState') != 1:
-                    continue
-            except errors.OperationFailure:
-                continue
-            break
+            with contextlib.suppress(errors.OperationFailure):
+                if get_repl_set_status().get('myState') == 1:
+                    break
+            time.sleep(next(delays))
         else:
             raise RuntimeError("timeout waiting for replica set to start")
 
     def start_instance(self, number):
+        """
+        Launch the mongod for member `number`, without waiting for it.
+        """
         port = portend.find_available_local_port()
         data_dir = os.path.join(self.data_root, repr(number))
         os.mkdir(data_dir)
@@ -231,12 +445,32 @@ class MongoDBReplicaSet(MongoDBFinder, services.Service):
             '--replSet',
             self.replica_set_name,
         ] + list(self.mongod_parameters)
+        if self.fast_storage:
+            cmd += fast_storage_args(self.find_binary(), replica_set=True)
         log_file = self.get_log(number)
         process = subprocess.Popen(cmd, stdout=log_file)
-        portend.occupied('localhost', port, timeout=50)
-        log.info(f'{self}:{number} listening on {port}')
         return InstanceInfo(data_dir, port, process, log_file)
 
+    def wait_for_instance(self, number, instance):
+        """
+        Tail the log of the instance until it reports
+        that it is waiting for connections.
+        """
+        watch = timing.Stopwatch()
+        output = ''
+        with open(instance.log_file.name, encoding='utf-8') as reader:
+            while not self.ready_pattern.search(output):
+                if instance.process.poll() is not None:
+                    raise RuntimeError(f"{self}:{number} terminated on startup")
+                if watch.elapsed > self.startup_timeout:
+                    raise RuntimeError(f"timeout waiting for {self}:{number}")
+                data = reader.read()
+                if not data:
+                    time.sleep(0.05)
+                # retain enough to match a pattern split across reads
+                output = output[-100:] + data
+        log.info(f'{self}:{number} listening on {instance.port}')
+
     def get_log(self, number):
         log_filename = os.path.join(self.data_root, f'r{number}.log')
         log_file = open(log_filename, 'a', encoding='utf-8')
@@ -264,11 +498,15 @@ class MongoDBReplicaSet(MongoDBFinder, services.Service):
                 dict(
                     _id=number,
                     host=f'localhost:{instance.port}',
+                    **self._member_options(number),
                 )
                 for number, instance in enumerate(self.instances)
             ],
         )
 
+    def _member_options(self, number):
+        return dict(arbiterOnly=True) if number >= self.member_count else {}
+
     def get_connect_hosts(self):
         return [f'localhost:{instance.port}' for instance in self.instances]
 
@@ -30,6 +30,7 @@ to encode more complex objects in the session::
 """
 
 import datetime
+import functools
 import logging
 import pprint
 import time
@@ -75,6 +76,9 @@ class Session(cherrypy.lib.sessions.Session):
     codec = NullCodec()
     "by default, objects are passed directly to MongoDB"
 
+    stale_lock_timeout = datetime.timedelta(hours=1)
+    "age after which a lock on a record with no session data is orphaned"
+
     def __init__(self, id, **kwargs):
         kwargs.setdefault('collection_name', 'sessions')
         kwargs.setdefault('lock_timeout', None)
@@ -102,11 +106,11 @@ class Session(cherrypy.lib.sessions.Session):
     def setup_expiration(self):
         """
         Use pymongo TTL index to automatically expire sessions.
+
+        The index is only requested once per process for each
+        collection.
         """
-        self.collection.create_index(
-            '_expiration_datetime',
-            expireAfterSeconds=0,
-        )
+        _ensure_expiration_index(self.collection)
 
     def _exists(self):
         return bool(self.collection.find_one(self.id))
@@ -203,5 +207,31 @@ class Session(cherrypy.lib.sessions.Session):
         self.collection.delete_one(record_spec)
         self.locked = False
 
+    def clean_up(self):
+        """
+        Remove orphaned records, those that were locked but never
+        saved (and so have no expiration) and whose lock was never
+        released. Invoked periodically by CherryPy when
+        ``clean_freq`` is set. Return the number of records removed.
+        """
+        cutoff = datetime.datetime.utcnow() - self.stale_lock_timeout
+        orphaned_spec = dict(
+            _expiration_datetime={'$exists': False},
+            locked={'$lt': cutoff},
+        )
+        return self.collection.delete_many(orphaned_spec).deleted_count
+
     def __len__(self):
-        return self.collection.count()
+        """
+        Return the approximate number of sessions, based on
+        collection metadata (including records that only hold a lock).
+        """
+        return self.collection.estimated_document_count()
+
+
+@functools.lru_cache(maxsize=None)
+def _ensure_expiration_index(collection):
+    collection.create_index(
+        '_expiration_datetime',
+        expireAfterSeconds=0,
+    )
@@ -1,5 +1,13 @@
+from __future__ import annotations
+
+import concurrent.futures
+import json
+import math
+import pathlib
 import pprint
 import textwrap
+from collections.abc import Mapping
+from typing import Any, NamedTuple
 
 from .query import compat_explain
 
@@ -67,3 +75,141 @@ def assert_distinct_covered(coll, field, query):
     assert stats['nscannedObjects'] == 0, report
     assert stats['n'], "No documents matched"
     return stats
+
+
+def _stages(plan):
+    yield plan
+    for child in plan.get('inputStages', [plan.get('inputStage')]):
+        if child:
+            yield from _stages(child)
+
+
+class Plan(NamedTuple):
+    """
+    The essentials of the winning plan for a query.
+    """
+
+    stages: tuple[str, ...]
+    indexes: tuple[str, ...]
+    keys_examined: int
+    docs_examined: int
+
+    @classmethod
+    def from_explanation(cls, explanation):
+        winning = explanation['queryPlanner']['winningPlan']
+        stages = list(_stages(_mongo7_query_plan(winning)))
+        stats = explanation['executionStats']
+        return cls(
+            stages=tuple(stage['stage'] for stage in stages),
+            indexes=tuple(
+                stage['indexName'] for stage in stages if 'indexName' in stage
+            ),
+            keys_examined=stats['totalKeysExamined'],
+            docs_examined=stats['totalDocsExamined'],
+        )
+
+    @property
+    def shape(self):
+        """
+        The parts of the plan kept in a snapshot.
+        """
+        return dict(stages=list(self.stages), indexes=list(self.indexes))
+
+
+class PlannedQuery(NamedTuple):
+    """
+    A query with expectations about its plan: that it doesn't scan
+    the collection (unless ``allow_scan``), that it uses ``index_name``
+    (if given), and that it examines no more than ``max_keys`` keys
+    and ``max_docs`` documents.
+    """
+
+    collection: str
+    filter: Mapping
+    projection: Any = None
+    sort: Any = None
+    index_name: str | None = None
+    allow_scan: bool = False
+    max_keys: float = math.inf
+    max_docs: float = math.inf
+
+    def explain(self, db):
+        cur = db[self.collection].find(self.filter, self.projection, sort=self.sort)
+        return Plan.from_explanation(compat_explain(cur))
+
+    def violations(self, plan):
+        if 'COLLSCAN' in plan.stages and not self.allow_scan:
+            yield "scanned the collection"
+        if self.index_name and self.index_name not in plan.indexes:
+            yield f"used {plan.indexes or 'no index'} rather than {self.index_name}"
+        if plan.keys_examined > self.max_keys:
+            yield f"examined {plan.keys_examined} keys (max {self.max_keys})"
+        if plan.docs_examined > self.max_docs:
+            yield f"examined {plan.docs_examined} documents (max {self.max_docs})"
+
+
+class QueryPlans:
+    """
+    Named queries whose plans are explained together and checked
+    against their expectations and against a snapshot of the plans
+    previously seen, to catch an index change that silently changes
+    a plan.
+
+    >>> plans = QueryPlans()
+    >>> plans.register('by foo', 'things', {'foo': 'bar'}, index_name='foo_1')
+    >>> plan = Plan(('FETCH', 'IXSCAN'), ('foo_1',), 1, 1)
+    >>> list(plans.regressions({'by foo': plan}))
+    []
+    >>> scan = Plan(('COLLSCAN',), (), 0, 10)
+    >>> for regression in plans.regressions({'by foo': scan}, {'by foo': plan.shape}):
+    ...     print(regression)
+    by foo: scanned the collection
+    by foo: used no index rather than foo_1
+    by foo: plan changed from ['FETCH', 'IXSCAN'] using ['foo_1'] to ['COLLSCAN'] using []
+    """
+
+    workers = 4
+
+    def __init__(self):
+        self.queries: dict[str, PlannedQuery] = {}
+
+    def register(self, name, collection, filter, **expectations):
+        self.queries[name] = PlannedQuery(collection, filter, **expectations)
+
+    def explain_all(self, db):
+        """
+        Explain all queries concurrently, returning the plan for each.
+        """
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            plans = executor.map(lambda query: query.explain(db), self.queries.values())
+            return dict(zip(self.queries, plans))
+
+    def regressions(self, plans, snapshot: Mapping = {}):
+        for name, plan in plans.items():
+            for violation in self.queries[name].violations(plan):
+                yield f"{name}: {violation}"
+            expected = snapshot.get(name)
+            if expected and expected != plan.shape:
+                yield (
+                    f"{name}: plan changed from {expected['stages']} "
+                    f"using {expected['indexes']} to {list(plan.stages)} "
+                    f"using {list(plan.indexes)}"
+                )
+
+    def assert_plans(self, db, snapshot_path=None, update=False):
+        """
+        Explain all queries and fail on any regression. If a
+        snapshot path is given, also compare against the plans it
+        holds, recording plans for queries new to it (or for all
+        queries if ``update``).
+        """
+        plans = self.explain_all(db)
+        path = snapshot_path and pathlib.Path(snapshot_path)
+        snapshot = json.loads(path.read_text()) if path and path.exists() else {}
+        regressions = list(self.regressions(plans, {} if update else snapshot))
+        if path and (update or plans.keys() - snapshot.keys()):
+            recorded = {name: plan.shape for name, plan in plans.items()}
+            snapshot.update(recorded if update else recorded | snapshot)
+            path.write_text(json.dumps(snapshot, indent=2, sort_keys=True))
+        assert not regressions, "Query plans regressed:\n" + "\n".join(regressions)
+        return plans
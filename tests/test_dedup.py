@@ -0,0 +1,76 @@
+import importlib
+import io
+
+import gridfs
+
+from jaraco.mongodb import dedup, helper, integrity
+
+check_gridfs = importlib.import_module('jaraco.mongodb.check-gridfs')
+
+
+def test_dedup_preserves_integrity(database):
+    """
+    Deduplicated files pass the checks, even after the file whose
+    chunks were copied to the blob is deleted by plain GridFS.
+    """
+    gfs = dedup.DedupGridFS(database)
+    first, other = (gfs.put(io.BytesIO(b'x' * 600), chunkSize=256) for n in range(2))
+    distinct = gfs.put(io.BytesIO(b'y' * 600), chunkSize=256)
+    deduplicator = dedup.Deduplicator(gfs)
+    assert deduplicator.hash_all() == 3
+    assert deduplicator.collapse_all() == 2
+    gridfs.GridFS(database).delete(first)
+
+    coll = helper.gridfs_collection(gfs)
+    assert list(integrity.find_problems(coll)) == []
+    assert list(filter(None, integrity.ContentVerifier(gfs).verify_all())) == []
+    assert gfs.get(other).read() == b'x' * 600
+    assert gfs.get(distinct).read() == b'y' * 600
+
+
+def test_collapse_onto_existing_blob(database):
+    gfs = dedup.DedupGridFS(database)
+    first = gfs.put(io.BytesIO(b'data'))
+    second = gfs.put(io.BytesIO(b'data'))
+    deduplicator = dedup.Deduplicator(gfs)
+    deduplicator.hash_all()
+    deduplicator.collapse_all()
+    late = gfs.put(io.BytesIO(b'data'))
+    deduplicator.hash_all()
+    assert deduplicator.collapse_all() == 1
+    coll = helper.gridfs_collection(gfs)
+    assert coll.blobs.find_one()['refs'] == 3
+    for id in first, second, late:
+        gfs.delete(id)
+    assert coll.blobs.count_documents({}) == 0
+    assert coll.chunks.count_documents({}) == 0
+
+
+def test_missing_blob_reported(database):
+    gfs = dedup.DedupGridFS(database)
+    ids = [gfs.put(io.BytesIO(b'data')) for n in range(2)]
+    deduplicator = dedup.Deduplicator(gfs)
+    deduplicator.hash_all()
+    deduplicator.collapse_all()
+    coll = helper.gridfs_collection(gfs)
+    coll.blobs.delete_many({})
+    problems = integrity.find_problems(coll)
+    assert sorted(problem.files_id for problem in problems) == sorted(ids)
+
+
+def test_read_deduplicated(database):
+    """
+    Deduplicated files are readable by name and by query, and
+    pass the default check.
+    """
+    gfs = dedup.DedupGridFS(database)
+    for name in 'ab':
+        gfs.put(io.BytesIO(b'data'), filename=name)
+    deduplicator = dedup.Deduplicator(gfs)
+    deduplicator.hash_all()
+    assert deduplicator.collapse_all() == 2
+    assert gfs.get_last_version('a').read() == b'data'
+    assert gfs.get_version('b', 0).read() == b'data'
+    assert [file.read() for file in gfs.find({'filename': 'b'})] == [b'data']
+    assert gfs.find_one({'filename': 'a'}).read() == b'data'
+    assert check_gridfs.FileChecker(gridfs.GridFS(database), 1024).run().count == 0
@@ -8,3 +8,14 @@ def test_insert_with_dots(mongodb_instance):
     doc = db.things.find_one({field: "value"})
     doc = {fields.decode(key): value for key, value in doc.items()}
     assert doc['foo.bar'] == 'value'
+
+
+def test_encode_keys_copies_only_changes():
+    unchanged = {'c': [1, {'d': 2}]}
+    doc = {'a': unchanged, 'b': [{'e.f': 3}, unchanged]}
+    encoded = fields.encode_keys(doc)
+    assert encoded == {'a': unchanged, 'b': [{'e\\Df': 3}, unchanged]}
+    assert encoded['a'] is unchanged
+    assert encoded['b'][1] is unchanged
+    assert fields.encode_keys(unchanged) is unchanged
+    assert fields.decode_keys(encoded) == doc
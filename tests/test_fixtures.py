@@ -0,0 +1,107 @@
+import contextlib
+import types
+
+import pytest
+
+from jaraco.mongodb import fixtures, service
+
+
+class Config:
+    """
+    A stand-in for a pytest config with the given options.
+    """
+
+    def __init__(self, workerinput=None, **options):
+        self.options = options
+        if workerinput is not None:
+            self.workerinput = workerinput
+
+    def getoption(self, name, default=None):
+        return self.options.get(name, default)
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """
+    Stand in for starting ephemeral instances, recording the
+    URIs started and how many times mongod was located.
+    """
+    uris = []
+    ensured = []
+
+    def start_one(self, number):
+        uri = f'mongodb://localhost:{27100 + len(uris)}'
+        uris.append(uri)
+        return contextlib.nullcontext(), types.SimpleNamespace(get_uri=lambda: uri)
+
+    def ensure():
+        ensured.append(True)
+        return contextlib.nullcontext()
+
+    monkeypatch.delenv('MONGODB_URL', raising=False)
+    monkeypatch.setattr(fixtures._WorkerInstances, '_start_one', start_one)
+    monkeypatch.setattr(service.MongoDBInstance, 'ensure', ensure)
+    return types.SimpleNamespace(uris=uris, ensured=ensured)
+
+
+def test_first_instance_prefers_worker():
+    config = Config(
+        workerinput=dict(mongodb_uri='mongodb://worker'),
+        mongodb_uri='mongodb://extant',
+    )
+    (instance,) = fixtures._first_instance(config)
+    assert instance.get_uri() == 'mongodb://worker'
+
+
+def test_first_instance_extant():
+    (instance,) = fixtures._first_instance(Config(mongodb_uri='mongodb://extant'))
+    assert instance.get_uri() == 'mongodb://extant'
+
+
+def test_worker_prefix():
+    assert fixtures._worker_prefix(Config()) == ''
+    assert fixtures._worker_prefix(Config(workerinput=dict(workerid='gw1'))) == 'gw1_'
+
+
+def test_assign_pool(started):
+    instances = fixtures._WorkerInstances(
+        Config(mongodb_workers='pool', numprocesses=2)
+    )
+    first, second = instances.assign('gw0'), instances.assign('gw1')
+    assert {first, second} == set(started.uris)
+    assert instances.assign('gw0') == first
+    assert started.ensured == [True]
+    instances.assign('gw2')
+    assert len(started.uris) == 3
+
+
+def test_assign_shared(started):
+    instances = fixtures._WorkerInstances(
+        Config(mongodb_workers='shared', numprocesses=4)
+    )
+    assert {instances.assign(f'gw{n}') for n in range(4)} == set(started.uris)
+    assert len(started.uris) == 1
+
+
+def test_configure_node(started):
+    config = Config(mongodb_workers='shared')
+    nodes = [
+        types.SimpleNamespace(
+            config=config, gateway=types.SimpleNamespace(id=f'gw{n}'), workerinput={}
+        )
+        for n in range(2)
+    ]
+    for node in nodes:
+        fixtures.pytest_configure_node(node)
+    assert [node.workerinput['mongodb_uri'] for node in nodes] == started.uris * 2
+    fixtures.pytest_unconfigure(config)
+
+
+def test_configure_node_extant(started):
+    config = Config(mongodb_workers='pool', mongodb_uri='mongodb://extant')
+    node = types.SimpleNamespace(
+        config=config, gateway=types.SimpleNamespace(id='gw0'), workerinput={}
+    )
+    fixtures.pytest_configure_node(node)
+    assert node.workerinput == {}
+    assert started.uris == []
@@ -0,0 +1,33 @@
+from jaraco.mongodb import helper
+
+
+def test_registry_after_fork(monkeypatch):
+    registry = helper.ClientRegistry()
+    client = registry.get('mongodb://mgo/')
+    monkeypatch.setattr(registry, 'pid', -1)
+    assert registry.get('mongodb://mgo/') is not client
+    assert registry.get('mongodb://mgo/') is registry.get('mongodb://mgo/')
+    client.close()
+    registry.close()
+    assert registry.clients == {}
+
+
+def test_connect_db_parses_once(monkeypatch):
+    """
+    Repeated connections for a URI shouldn't parse it again
+    (which, for an SRV URI, would look up DNS records).
+    """
+    parse = helper.pymongo.uri_parser.parse_uri
+    calls = []
+
+    def counting_parse(uri):
+        calls.append(uri)
+        return parse(uri)
+
+    monkeypatch.setattr(helper.pymongo.uri_parser, 'parse_uri', counting_parse)
+    registry = helper.ClientRegistry()
+    uri = 'mongodb://parse-once/db'
+    for _ in range(3):
+        helper.connect_db(uri, factory=registry.get)
+    assert calls == [uri]
+    registry.close()
@@ -1,7 +1,13 @@
+import importlib
+import io
 import json
 import subprocess
 import sys
 
+import pytest
+
+insert_doc = importlib.import_module('jaraco.mongodb.insert-doc')
+
 
 def test_insert_doc_command(mongodb_instance):
     uri = mongodb_instance.get_uri() + '/testdb.test_coll'
@@ -18,3 +24,48 @@ def test_insert_doc_command(mongodb_instance):
     (saved,) = mongodb_instance.get_connection().testdb.test_coll.find()
     saved.pop('_id')
     assert saved == doc
+
+
+def test_insert_doc_bulk(mongodb_instance):
+    uri = mongodb_instance.get_uri() + '/testdb.test_bulk'
+    cmd = [
+        sys.executable,
+        '-m',
+        'jaraco.mongodb.insert-doc',
+        '--bulk',
+        '--batch-size',
+        '7',
+        '--workers',
+        '3',
+        uri,
+    ]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    docs = '\n'.join(json.dumps(dict(n=n)) for n in range(100))
+    proc.communicate(docs.encode('utf-8'))
+    assert not proc.wait()
+    coll = mongodb_instance.get_connection().testdb.test_bulk
+    assert sorted(coll.distinct('n')) == list(range(100))
+
+
+def test_iter_documents_malformed():
+    """
+    A malformed document should fail without reading the rest
+    of the stream.
+    """
+    lines = ['{"n": 0}', '{"n": 1,}'] + [json.dumps(dict(n=n)) for n in range(1000)]
+    stream = io.StringIO('\n'.join(lines))
+    docs = insert_doc.iter_documents(stream, chunk_size=64)
+    assert next(docs) == dict(n=0)
+    with pytest.raises(json.JSONDecodeError):
+        next(docs)
+    assert stream.tell() <= 128
+
+
+def test_iter_documents_split():
+    """
+    Documents split across reads at any point are decoded.
+    """
+    text = '{"a": "x\\"y", "b": [1.5e-3, true, null], "c": -Infinity}\n' * 3
+    for chunk_size in range(1, len(text)):
+        docs = list(insert_doc.iter_documents(io.StringIO(text), chunk_size))
+        assert len(docs) == 3
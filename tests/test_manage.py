@@ -1,11 +1,99 @@
+import pymongo.collection
+import pytest
+
 from jaraco.mongodb import manage
 
 
-def test_purge_all_databases(mongodb_instance):
-    client = mongodb_instance.get_connection()
-    client.test_db.test_coll.insert_one({'a': 1})
-    client.test_db2.test_coll.insert_one({'b': 2})
-    manage.purge_all_databases(client)
+@pytest.fixture
+def other_database(database):
+    """
+    A database outside the prefix of ``database``.
+    """
+    other = database.client['other_' + database.name]
+    yield other
+    database.client.drop_database(other.name)
+
+
+def test_purge_all_databases(database):
+    client = database.client
+    second = client[database.name + '_2']
+    database.test_coll.insert_one({'a': 1})
+    second.test_coll.insert_one({'b': 2})
+    manage.purge_all_databases(client, prefix=database.name)
     indexes = {'system.indexes'}
-    assert set(client.test_db.list_collection_names()) <= indexes
-    assert set(client.test_db2.list_collection_names()) <= indexes
+    assert set(database.list_collection_names()) <= indexes
+    assert set(second.list_collection_names()) <= indexes
+
+
+def test_reset_truncate(mongodb_instance, database, other_database):
+    database.test_coll.insert_one({'a': 1})
+    database.test_coll.create_index('a')
+    other_database.test_coll.insert_one({'a': 1})
+    mongodb_instance.reset('truncate', prefix=database.name)
+    assert database.test_coll.count_documents({}) == 0
+    assert 'a_1' in database.test_coll.index_information()
+    mongodb_instance.reset(prefix=database.name)
+    names = database.client.list_database_names()
+    assert database.name not in names
+    assert other_database.test_coll.count_documents({}) == 1
+
+
+def test_reset_restore(mongodb_instance, database, other_database):
+    database.seeded.insert_one({'a': 1})
+    database.seeded.create_index('a')
+    other_database.untouched.insert_one({'a': 1})
+    mongodb_instance.snapshot(prefix=database.name)
+    database.seeded.insert_one({'a': 2})
+    database.seeded.drop()
+    database.created.insert_one({'b': 1})
+    mongodb_instance.reset('restore', prefix=database.name)
+    assert set(manage.all_collections(database)) == {database.seeded}
+    assert [doc['a'] for doc in database.seeded.find()] == [1]
+    assert 'a_1' in database.seeded.index_information()
+    assert other_database.list_collection_names() == ['untouched']
+
+
+def test_reset_defaults_to_db_prefix(mongodb_instance, database, other_database):
+    other_database.test_coll.insert_one({'a': 1})
+    database.test_coll.insert_one({'a': 1})
+    prefix, mongodb_instance.db_prefix = mongodb_instance.db_prefix, database.name
+    try:
+        mongodb_instance.reset()
+    finally:
+        mongodb_instance.db_prefix = prefix
+    assert database.name not in database.client.list_database_names()
+    assert other_database.test_coll.count_documents({}) == 1
+
+
+def test_purge_all_databases_reports_namespaces(database):
+    database.good.insert_one({'a': 1})
+    database.bad.insert_one({'a': 1})
+
+    def op(coll):
+        if coll.name == 'bad':
+            raise ValueError(coll.name)
+        return coll.name
+
+    with pytest.raises(manage.NamespaceErrors) as exc_info:
+        manage.purge_all_databases(database.client, op=op, prefix=database.name)
+    assert set(exc_info.value.errors) == {f'{database.name}.bad'}
+    assert exc_info.value.results[f'{database.name}.good'] == 'good'
+
+
+def test_safe_purge_uses_listed_options(database, monkeypatch):
+    """
+    Purging with safe_purge_collection should use the options
+    from listCollections rather than querying each collection.
+    """
+    database.create_collection('capped', capped=True, size=4096)
+    database.plain.insert_one({'a': 1})
+
+    def options(self):
+        raise AssertionError("options() called")
+
+    monkeypatch.setattr(pymongo.collection.Collection, 'options', options)
+    manage.purge_all_databases(
+        database.client, op=manage.safe_purge_collection, prefix=database.name
+    )
+    assert database.list_collection_names() == ['plain']
+    assert database.plain.count_documents({}) == 0
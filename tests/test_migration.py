@@ -0,0 +1,75 @@
+import pytest
+
+from jaraco.mongodb import migration
+
+
+@pytest.fixture
+def manager():
+    @migration.Manager.register
+    def v1_to_2(manager, doc):
+        doc['foo'] = 'bar'
+
+    @migration.Manager.register
+    def v2_to_3(manager, doc):
+        doc['foo'] += ' baz'
+
+    yield migration.Manager(3)
+    migration.Manager._upgrade_funcs.clear()
+
+
+def test_migrate_collection(manager, database):
+    coll = database.things
+    coll.insert_many([dict(_id=n, version=1 + n % 3, foo='') for n in range(10)])
+    batches = list(manager.migrate_collection(coll, batch_size=3))
+    assert sum(batch.result.modified_count for batch in batches) == 7
+    assert batches[-1].last_id == 9
+    assert coll.count_documents({'version': 3}) == 10
+    assert coll.find_one({'_id': 0})['foo'] == 'bar baz'
+    assert coll.find_one({'_id': 2})['foo'] == ''
+
+
+def test_migrate_collection_resume(manager, database):
+    coll = database.things
+    coll.insert_many([dict(_id=n, version=1) for n in range(10)])
+    first = next(manager.migrate_collection(coll, batch_size=4))
+    coll.update_many({}, {'$set': {'version': 1}})
+    resumed = manager.migrate_collection(coll, resume_after=first.last_id)
+    assert sum(batch.result.modified_count for batch in resumed) == 6
+
+
+def test_migrating_collection(manager, database):
+    database.things.insert_many([dict(_id=n, version=1) for n in range(3)])
+    with migration.MigratingCollection(manager, database.things) as things:
+        assert things.find_one(0)['foo'] == 'bar baz'
+        docs = list(things.find({'_id': {'$gt': 0}}).sort('_id', -1))
+        assert [doc['_id'] for doc in docs] == [2, 1]
+        assert all(doc['version'] == 3 for doc in docs)
+        docs[0]['foo'] = 'changed'
+    assert database.things.count_documents({'version': 3}) == 3
+    assert database.things.find_one(2)['foo'] == 'bar baz'
+
+
+def test_migrating_collection_projection(manager, database):
+    database.things.insert_one(dict(_id=1, version=1, other='value'))
+    with migration.MigratingCollection(manager, database.things) as things:
+        assert things.find_one(1, {'other': False})['version'] == 3
+    assert database.things.find_one(1) == dict(_id=1, version=1, other='value')
+
+
+def test_migrating_cursor_methods(manager, database):
+    database.things.insert_many([dict(_id=n, version=1) for n in range(3)])
+    with migration.MigratingCollection(manager, database.things) as things:
+        cursor = things.find().sort('_id')
+        assert cursor.next()['version'] == 3
+        assert [doc['version'] for doc in cursor.clone()] == [3, 3, 3]
+        assert [doc['version'] for doc in cursor.to_list()] == [3, 3]
+
+
+def test_migrating_collection_after_close(manager, database):
+    database.things.insert_many([dict(_id=n, version=1) for n in range(2)])
+    things = migration.MigratingCollection(manager, database.things)
+    things.find_one(0)
+    things.close()
+    assert things.find_one(1)['version'] == 3
+    assert database.things.count_documents({'version': 3}) == 2
+    things.close()
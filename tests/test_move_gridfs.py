@@ -0,0 +1,76 @@
+import importlib
+import io
+
+import pytest
+
+from jaraco.mongodb import helper
+
+move_gridfs = importlib.import_module('jaraco.mongodb.move-gridfs')
+
+
+@pytest.fixture
+def buckets(mongodb_uri, database):
+    db_uri = f'{mongodb_uri}/{database.name}'
+    source = helper.connect_gridfs(db_uri + '.source')
+    dest = helper.connect_gridfs(db_uri + '.dest')
+    return source, dest
+
+
+@pytest.mark.parametrize('server_side', [False, True])
+def test_move(buckets, server_side):
+    source, dest = buckets
+    ids = [
+        source.put(io.BytesIO(bytes(300 * 1024)), filename=f'{n}.bin') for n in range(5)
+    ]
+    mover = move_gridfs.FileMove(
+        source_gfs=source,
+        dest_gfs=dest,
+        delete=True,
+        workers=3,
+        batch_size=2,
+        chunk_batch_bytes=1024,
+        server_side=server_side,
+    )
+    mover.ensure_indexes()
+    mover.run(bar=None)
+    assert source.list() == []
+    assert all(dest.get(id).read() == bytes(300 * 1024) for id in ids)
+
+
+@pytest.mark.parametrize('journal_type', ['collection', 'file'])
+def test_resume(buckets, tmp_path, journal_type):
+    """
+    A move with a journal should skip files already moved
+    and repair a partial copy.
+    """
+    source, dest = buckets
+    moved, partial = (source.put(io.BytesIO(b'data'), filename=n) for n in 'ab')
+    journal = (
+        move_gridfs.CollectionJournal.for_dest(dest)
+        if journal_type == 'collection'
+        else move_gridfs.FileJournal(tmp_path / 'journal')
+    )
+    journal.record([moved])
+    source_coll = helper.gridfs_collection(source)
+    dest_coll = helper.gridfs_collection(dest)
+    dest_coll.chunks.insert_one(source_coll.chunks.find_one(dict(files_id=partial)))
+    mover = move_gridfs.FileMove(
+        source_gfs=source, dest_gfs=dest, delete=True, journal=journal
+    )
+    mover.run(bar=None)
+    assert source.list() == []
+    assert not dest.exists(moved)
+    assert dest.get(partial).read() == b'data'
+    assert journal.moved([moved, partial]) == {moved, partial}
+
+
+def test_skip_deduplicated(buckets):
+    source, dest = buckets
+    source_coll = helper.gridfs_collection(source)
+    plain = source.put(io.BytesIO(b'data'))
+    shared = source.put(io.BytesIO(b'data'), metadata=dict(blob='digest'))
+    mover = move_gridfs.FileMove(source_gfs=source, dest_gfs=dest, delete=True)
+    mover.run(bar=None)
+    assert dest.exists(plain)
+    assert not dest.exists(shared)
+    assert source_coll.files.distinct('_id') == [shared]
@@ -0,0 +1,31 @@
+from jaraco.mongodb import profiler
+
+
+def test_collect_flags_scans(database):
+    profile = profiler.Profiler(mode='report', slow_ms=10_000)
+    database.things.insert_many([dict(x=n, y=n) for n in range(10)])
+    database.things.create_index('y')
+    database.command('profile', 2)
+    client = database.client
+    start = profile._server_time(client)
+    database.things.find_one(dict(x=3))
+    database.things.find_one(dict(y=3))
+    list(database.things.find())
+    end = profile._server_time(client)
+    (finding,) = profile.collect(client, {database.name}, start, end)
+    assert finding.plan == 'COLLSCAN'
+    assert finding.shape == dict(x=1)
+
+
+def test_discovered_database_restored(database):
+    """
+    A database first used during a test is profiled, and its
+    previous level is restored when the session ends.
+    """
+    database.command('profile', 0)
+    profile = profiler.Profiler(mode='report', slow_ms=10_000)
+    profile.client = database.client
+    profile.discovered(database.name)
+    assert database.command('profile', -1)['was'] == 2
+    profile.pytest_unconfigure(config=None)
+    assert database.command('profile', -1)['was'] == 0
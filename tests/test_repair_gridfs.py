@@ -0,0 +1,40 @@
+import importlib
+import io
+
+import gridfs
+
+from jaraco.mongodb import helper
+
+repair_gridfs = importlib.import_module('jaraco.mongodb.repair-gridfs')
+
+
+def test_repair(database):
+    gfs = gridfs.GridFS(database)
+    coll = helper.gridfs_collection(gfs)
+    good, broken, orphaned = (
+        gfs.put(io.BytesIO(b'x' * 600), chunkSize=256) for n in range(3)
+    )
+    coll.chunks.delete_one(dict(files_id=broken, n=1))
+    coll.files.delete_one(dict(_id=orphaned))
+
+    repair = repair_gridfs.FileRepair(gfs)
+    repair.dry_run = True
+    assert repair.run().count == 2
+    assert coll.chunks.count_documents({}) == 8
+
+    repair.dry_run = False
+    assert repair.run().count == 2
+    assert gfs.get(good).read() == b'x' * 600
+    assert coll.chunks.distinct('files_id') == [good]
+    assert repair.backup_coll.files.distinct('_id') == [broken]
+    assert len(repair.backup_coll.chunks.distinct('files_id')) == 2
+
+
+def test_skip_deduplicated(database):
+    gfs = gridfs.GridFS(database)
+    coll = helper.gridfs_collection(gfs)
+    shared = gfs.put(io.BytesIO(b'data'), metadata=dict(blob='digest'))
+    coll.chunks.delete_many({})
+    repair = repair_gridfs.FileRepair(gfs)
+    assert repair.run().count == 1
+    assert coll.files.distinct('_id') == [shared]
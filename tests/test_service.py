@@ -28,3 +28,79 @@ def test_MongoDBReplicaSet_starts_quickly():
 def test_fixture(mongodb_instance):
     "Cause the fixture to be invoked"
     pass
+
+
+def test_MongoDBInstance_from_template(tmp_path):
+    """
+    Instances started from a template should each get
+    an isolated copy of the initialized data directory.
+    """
+    first = service.MongoDBInstance()
+    first.merge_mongod_args([])
+    first.template_root = str(tmp_path)
+    with first.ensure(), first.run():
+        first.get_connection().test_db.things.insert_one({'foo': 'bar'})
+        (template,) = tmp_path.iterdir()
+        second = service.MongoDBInstance()
+        second.merge_mongod_args([])
+        second.template_root = str(tmp_path)
+        with second.run():
+            assert second.get_connection().test_db.things.find_one() is None
+    assert list(tmp_path.iterdir()) == [template]
+
+
+def test_MongoDBReplicaSet_config_arbiters():
+    rs = service.MongoDBReplicaSet()
+    rs.member_count = 2
+    rs.arbiter_count = 1
+    rs.instances = [
+        service.InstanceInfo(str(number), port, None, None)
+        for number, port in enumerate([27100, 27101, 27102])
+    ]
+    members = rs.build_config()['members']
+    assert [member.get('arbiterOnly', False) for member in members] == [
+        False,
+        False,
+        True,
+    ]
+    assert members[2]['host'] == 'localhost:27102'
+
+
+@pytest.mark.parametrize(
+    'version, replica_set, journal_arg',
+    [
+        ('5.0.0', False, '--nojournal'),
+        ('5.0.0', True, '--journalCommitInterval'),
+        ('7.0.2', False, '--journalCommitInterval'),
+    ],
+)
+def test_fast_storage_args(monkeypatch, version, replica_set, journal_arg):
+    monkeypatch.setattr(
+        service, '_mongod_version', lambda binary: f'db version v{version}'
+    )
+    args = service.fast_storage_args('mongod', replica_set=replica_set)
+    assert args[0] == journal_arg
+    assert '--nojournal' not in args[1:]
+    assert args[-2:] == ['--wiredTigerCacheSizeGB', '0.25']
+
+
+@pytest.mark.parametrize('writable, expected', [(True, '/dev/shm'), (False, None)])
+def test_ram_directory(monkeypatch, writable, expected):
+    monkeypatch.setattr(service.os, 'access', lambda path, mode: writable)
+    assert service.ram_directory() == expected
+
+
+def test_MongoDBInstance_template_failure(tmp_path, monkeypatch):
+    """
+    A template that fails to build should leave nothing behind.
+    """
+    instance = service.MongoDBInstance()
+    instance.template_root = str(tmp_path)
+
+    def fail(data_dir):
+        raise RuntimeError("mongod failed to start")
+
+    monkeypatch.setattr(instance, '_initialize', fail)
+    with pytest.raises(RuntimeError):
+        instance._build_template(str(tmp_path / 'template'))
+    assert list(tmp_path.iterdir()) == []
@@ -70,3 +70,21 @@ class TestSessions:
         session = sessions.Session(session_id, database=database, use_modb=True)
         assert 3 in session
         assert session[3] == 9
+
+    def test_len(self, database):
+        session = sessions.Session(None, database=database)
+        session['x'] = 3
+        session.save()
+        assert len(session) == 1
+
+    def test_clean_up_orphaned_locks(self, database):
+        session = sessions.Session(None, database=database)
+        session.acquire_lock()
+        saved = sessions.Session(None, database=database)
+        saved['x'] = 3
+        saved.save()
+        stale = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        database.sessions.update_many({}, {'$set': dict(locked=stale)})
+        assert session.clean_up() == 1
+        assert not session._exists()
+        assert saved._exists()
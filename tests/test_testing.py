@@ -63,3 +63,23 @@ def test_assert_index_used_fails(indexed_collection):
     cur = indexed_collection.find({'bing': 'baz'})
     with pytest.raises(AssertionError):
         testing.assert_index_used(cur)
+
+
+def test_query_plans_snapshot(indexed_collection, tmp_path):
+    """
+    Plans are recorded in the snapshot, and a plan changed
+    by a dropped index is a regression.
+    """
+    indexed_collection.insert_many([{'foo': n, 'bing': n} for n in range(10)])
+    plans = testing.QueryPlans()
+    plans.register('by foo', indexed_collection.name, {'foo': 3}, max_docs=1)
+    plans.register('by bing', indexed_collection.name, {'bing': 3}, allow_scan=True)
+    snapshot = tmp_path / 'plans.json'
+    db = indexed_collection.database
+    plans.assert_plans(db, snapshot)
+    assert snapshot.exists()
+    plans.assert_plans(db, snapshot)
+
+    indexed_collection.drop_index('foo_1')
+    with pytest.raises(AssertionError, match='by foo: scanned the collection'):
+        plans.assert_plans(db, snapshot)